@@ -0,0 +1,86 @@
+import os
+import json
+import asyncio
+import discord
+
+BACKFILL_STATE_FILE = os.getenv("BACKFILL_STATE_FILE", "backfill_state.json")
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "100"))  # messages per process_batch call
+BACKFILL_FIRST_RUN_LIMIT = 5000  # newest messages scanned when a channel has no checkpoint yet
+
+
+def load_state(path=BACKFILL_STATE_FILE):
+    """Return {channel_id: {"last_message_id": int, "timestamp": str}} from the checkpoint file."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Corrupt backfill checkpoint {path}, starting over: {e}")
+        return {}
+
+
+def save_state(state, path=BACKFILL_STATE_FILE):
+    """Write the checkpoint atomically so a crash mid-write can't corrupt it."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+async def _fetch_new_messages(channel, last_message_id):
+    """Yield messages oldest-first: everything after the checkpoint, or the newest batch on a first run."""
+    if last_message_id:
+        async for message in channel.history(limit=None, after=discord.Object(id=last_message_id), oldest_first=True):
+            yield message
+        return
+
+    newest = [message async for message in channel.history(limit=BACKFILL_FIRST_RUN_LIMIT)]
+    for message in reversed(newest):
+        yield message
+
+
+async def backfill_channel(channel, process=None, concurrency=BACKFILL_CONCURRENCY,
+                           process_batch=None, batch_size=BACKFILL_BATCH_SIZE):
+    """Run `process(message)` over every message posted since the channel's checkpoint.
+
+    Messages are handled `concurrency` at a time; the checkpoint never advances past a
+    message whose processing raised, and the scan stops by re-raising that error, so a
+    restart never skips any. Alternatively `process_batch(messages)` handles `batch_size`
+    messages per call and returns one result per message; if it raises, the scan stops at
+    the last checkpoint. Returns the non-None results.
+    """
+    state = load_state()
+    key = str(channel.id)
+    last_message_id = state.get(key, {}).get("last_message_id")
+    results, group, processed = [], [], 0
+    group_size = batch_size if process_batch else concurrency
+
+    async def run_group():
+        nonlocal processed
+        if process_batch:
+            outcomes = await process_batch(list(group))
+        else:
+            outcomes = await asyncio.gather(*(process(m) for m in group), return_exceptions=True)
+        failed = next((i for i, outcome in enumerate(outcomes) if isinstance(outcome, Exception)), None)
+        done = group[:failed]  # later messages of the group are processed again after a restart
+        results.extend(outcome for outcome in outcomes[:len(done)] if outcome is not None)
+        processed += len(done)
+        if done:
+            state[key] = {"last_message_id": done[-1].id, "timestamp": done[-1].created_at.isoformat()}
+            save_state(state)
+        if failed is not None:
+            print(f"⚠️ Backfill failed for message {group[failed].id}, stopping at it: {outcomes[failed]}")
+            raise outcomes[failed]
+        group.clear()
+
+    async for message in _fetch_new_messages(channel, last_message_id):
+        group.append(message)
+        if len(group) >= group_size:
+            await run_group()
+    if group:
+        await run_group()
+
+    print(f"✅ Backfilled {processed} new messages from #{channel} ({len(results)} kept).")
+    return results
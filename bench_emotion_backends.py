@@ -0,0 +1,140 @@
+# bench_emotion_backends.py
+# Accuracy parity and speed of the emotion backends (see emotion_backends.py) on a held-out sample
+# of chat.json messages. Each backend runs in its own process so load time and RSS are comparable;
+# torch (pysentimiento's own analyzer) is the reference. Exits non-zero if a backend's predictions drift too far from it.
+# Usage: python bench_emotion_backends.py [--backends torch,torch-batched,int8,onnx,onnx-int8] [--sample 200] [--min-agreement 0.95]
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+DETECT_LABELS = ["joy", "anger", "sadness", "fear"]  # what util.detect_emotion reports
+DETECT_THRESHOLD = 0.85
+
+
+def held_out_sample(path, size, seed):
+    with open(path, "r", encoding="utf-8") as f:
+        messages = [e["content"] for e in json.load(f) if e.get("role") == "user" and e.get("content", "").strip()]
+    random.Random(seed).shuffle(messages)
+    return messages[:size]
+
+
+def run_worker(backend_name, sample_path, batch_size):
+    """Runs inside the per-backend process; prints one JSON line of results."""
+    import psutil
+    from emotion_backends import load_backend
+
+    with open(sample_path, "r", encoding="utf-8") as f:
+        texts = json.load(f)
+    process = psutil.Process()
+
+    start = time.perf_counter()
+    backend = load_backend(backend_name)
+    load_s = time.perf_counter() - start
+    rss_loaded = process.memory_info().rss
+
+    backend.predict(texts[:2])  # warm-up
+
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        backend.predict([text])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(texts), batch_size):
+        results.extend(backend.predict(texts[i:i + batch_size]))
+    batch_s = time.perf_counter() - start
+
+    latencies.sort()
+    print(json.dumps({
+        "load_s": load_s,
+        "rss_loaded_mb": rss_loaded / 2**20,
+        "rss_peak_mb": process.memory_info().rss / 2**20,
+        "latency_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "latency_p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "throughput_msgs_s": len(texts) / batch_s,
+        "probas": [r.probas for r in results],
+    }))
+
+
+def decision(probas):
+    return next((label for label in DETECT_LABELS if probas.get(label, 0) > DETECT_THRESHOLD), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emotion backend parity and benchmark")
+    parser.add_argument("--backends", default="torch,torch-batched,int8,onnx,onnx-int8")
+    parser.add_argument("--data", default="chat.json")
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="top-label agreement with torch")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--sample-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.sample_file, args.batch_size)
+        return
+
+    texts = held_out_sample(args.data, args.sample, args.seed)
+    backends = [b for b in args.backends.split(",") if b]
+    if "torch" in backends:
+        backends.remove("torch")
+    backends.insert(0, "torch")  # the reference
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(texts, f)
+        sample_path = f.name
+
+    results = {}
+    try:
+        for name in backends:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", name, "--sample-file", sample_path,
+                 "--batch-size", str(args.batch_size)],
+                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            if proc.returncode != 0:
+                print(f"❌ {name}: failed to run\n{proc.stderr[-2000:]}")
+                continue
+            results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        os.remove(sample_path)
+
+    if "torch" not in results:
+        print("❌ The torch reference backend didn't run; nothing to compare against.")
+        sys.exit(1)
+
+    reference = results["torch"]["probas"]
+    print(f"{len(texts)} held-out messages from {args.data}, batch size {args.batch_size}\n")
+    print(f"{'backend':10s} {'load s':>7s} {'RSS MB':>7s} {'p50 ms':>7s} {'p95 ms':>7s} {'msg/s':>7s} "
+          f"{'top-1 agree':>11s} {'detect agree':>12s} {'max |dp|':>8s}")
+
+    failures = []
+    for name, r in results.items():
+        probas = r["probas"]
+        top1 = statistics.mean(
+            max(p, key=p.get) == max(ref, key=ref.get) for p, ref in zip(probas, reference)
+        )
+        detect = statistics.mean(decision(p) == decision(ref) for p, ref in zip(probas, reference))
+        max_diff = max(abs(p[k] - ref[k]) for p, ref in zip(probas, reference) for k in ref)
+        print(f"{name:10s} {r['load_s']:7.1f} {r['rss_peak_mb']:7.0f} {r['latency_p50_ms']:7.1f} "
+              f"{r['latency_p95_ms']:7.1f} {r['throughput_msgs_s']:7.1f} {top1:11.1%} {detect:12.1%} {max_diff:8.3f}")
+        if top1 < args.min_agreement:
+            failures.append(f"{name}: top-1 agreement {top1:.1%} < {args.min_agreement:.0%}")
+
+    if failures:
+        print("\nParity check failed:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
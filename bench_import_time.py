@@ -0,0 +1,88 @@
+# bench_import_time.py
+# Measures cold-start import time of the bot's modules in fresh interpreters and exits non-zero
+# on a regression: a median over budget, or a heavy ML/data library loaded at import time.
+# Usage: python bench_import_time.py [--runs 5] [--budget util=2.0] [--budget main=6.0] [--profile]
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Must only be loaded on demand (see util.get_emotion_analyzer)
+HEAVY_MODULES = ["torch", "transformers", "pysentimiento", "pandas", "scipy", "sklearn", "plotly"]
+# Median seconds per module; main includes the Weaviate client connecting
+DEFAULT_BUDGETS = {"util": 2.0, "main": 6.0}
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(module):
+    """Import module in a fresh interpreter; returns (seconds, heavy modules it pulled in)."""
+    code = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps([elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO_DIR, timeout=600)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    elapsed, heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, heavy
+
+
+def slowest_imports(module, top=10):
+    """Top imports by cumulative time, from python -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, cwd=REPO_DIR, timeout=600
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import time check")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", action="append", default=[], help="module=seconds, e.g. util=2.0")
+    parser.add_argument("--profile", action="store_true", help="also list the slowest imports per module")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in args.budget:
+        module, seconds = item.split("=")
+        budgets[module] = float(seconds)
+
+    failures = []
+    for module, budget in budgets.items():
+        samples, heavy = [], set()
+        for _ in range(args.runs):
+            elapsed, loaded = measure(module)
+            samples.append(elapsed)
+            heavy.update(loaded)
+
+        median = statistics.median(samples)
+        ok = median <= budget and not heavy
+        print(f"{'✅' if ok else '❌'} import {module}: median {median:.2f}s, min {min(samples):.2f}s "
+              f"over {args.runs} runs (budget {budget:.2f}s)")
+        if heavy:
+            failures.append(f"import {module} loads {', '.join(sorted(heavy))}")
+        if median > budget:
+            failures.append(f"import {module} takes {median:.2f}s (budget {budget:.2f}s)")
+
+        if args.profile or not ok:
+            for cumulative, name in slowest_imports(module):
+                print(f"    {cumulative / 1e6:6.2f}s  {name}")
+
+    if failures:
+        print("\nCold-start regression:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
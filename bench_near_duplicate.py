@@ -0,0 +1,65 @@
+# bench_near_duplicate.py
+# Compares the MinHash/LSH near-duplicate filter with a linear scan using util.has_majority_common_words.
+# Usage: python bench_near_duplicate.py [chat.json ...]
+import sys
+import json
+import time
+import random
+from near_duplicate import NearDuplicateIndex
+from util import has_majority_common_words
+
+
+def load_texts(paths):
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.extend(e["content"] for e in json.load(f) if e.get("role") in ("user", "assistant") and e.get("content"))
+    return list(dict.fromkeys(texts))
+
+
+def perturb(text, rng):
+    """A light edit of text: one word dropped or repeated."""
+    words = text.split()
+    if len(words) < 4:
+        return text + "?"
+    i = rng.randrange(len(words))
+    return " ".join(words[:i] + words[i + 1:]) if rng.random() < 0.5 else " ".join(words[:i + 1] + words[i:])
+
+
+def main(paths):
+    rng = random.Random(42)
+    texts = load_texts(paths)
+    stored, held_out = texts[: len(texts) * 4 // 5], texts[len(texts) * 4 // 5:]
+    # Repeats (lightly edited stored texts) and genuinely new texts
+    queries = [(perturb(t, rng), True) for t in rng.sample(stored, min(200, len(stored)))]
+    queries += [(t, False) for t in held_out]
+
+    index = NearDuplicateIndex()  # same defaults as db.NEAR_DUP_*
+    start = time.perf_counter()
+    index.add_many(range(len(stored)), stored)
+    build_s = time.perf_counter() - start
+
+    results = {}
+    for name, is_dup in (
+        ("minhash_lsh", index.is_duplicate),
+        ("word_overlap_scan", lambda q: any(has_majority_common_words(q, s) for s in stored)),
+    ):
+        start = time.perf_counter()
+        flags = [is_dup(q) for q, _ in queries]
+        elapsed = time.perf_counter() - start
+        repeats_caught = sum(f for f, (_, repeat) in zip(flags, queries) if repeat)
+        new_flagged = sum(f for f, (_, repeat) in zip(flags, queries) if not repeat)
+        results[name] = flags
+        print(
+            f"{name:18s} {elapsed / len(queries) * 1000:8.3f} ms/message  "
+            f"repeats caught {repeats_caught}/{sum(r for _, r in queries)}  "
+            f"new texts flagged {new_flagged}/{sum(not r for _, r in queries)}"
+        )
+
+    agreement = sum(a == b for a, b in zip(results["minhash_lsh"], results["word_overlap_scan"])) / len(queries)
+    print(f"\n{len(stored)} stored texts, {len(queries)} queries, index built in {build_s * 1000:.1f} ms "
+          f"({index.bands} bands x {index.rows} rows), agreement {agreement:.1%}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or ["chat.json", "combined_qa_conversation.json"])
@@ -0,0 +1,72 @@
+# bench_vector_snapshot.py
+# Warm-start cost of the local vector index: a JSON export like weaviate_export.json versus the binary
+# snapshot (snapshot.py) in float32 and float16, on synthetic records. Reports file size, load time and
+# the first query after loading (which pages the mapped vectors in).
+# Usage: python bench_vector_snapshot.py [--records 20000] [--dim 1536]
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from vector_index import VectorIndex
+
+
+def size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2**20
+    return os.path.getsize(path) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector index snapshot load benchmark")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((args.records, args.dim), dtype=np.float32)
+    roles = ["user" if i % 2 else "assistant" for i in range(args.records)]
+    contents = [f"message {i} " + "lorem ipsum " * (i % 20) for i in range(args.records)]
+    timestamps = ["2025-02-17T18:51:18Z"] * args.records
+    query = rng.standard_normal(args.dim, dtype=np.float32)
+
+    source = VectorIndex()
+    source.add_many(roles, contents, vectors, [f"{i:08d}-0000-0000-0000-000000000000" for i in range(args.records)], timestamps)
+
+    workdir = tempfile.mkdtemp(prefix="vector_snapshot_")
+    try:
+        json_path = os.path.join(workdir, "export.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump([
+                {"role": r, "content": c, "timestamp": t, "embedding": v.tolist()}
+                for r, c, t, v in zip(roles, contents, timestamps, vectors)
+            ], f)
+
+        cases = [("json", json_path, lambda index: index.load_snapshot(json_path))]
+        for dtype in ("float32", "float16"):
+            path = os.path.join(workdir, f"snapshot_{dtype}")
+            source.save_binary_snapshot(path, dtype)
+            cases.append((f"binary {dtype}", path, lambda index, path=path: index.load_binary_snapshot(path)))
+
+        print(f"{args.records} records × {args.dim} dims\n")
+        print(f"{'format':15s} {'size MB':>8s} {'load ms':>9s} {'1st query ms':>12s} {'best match':>10s}")
+        expected = source.search(query)
+        for name, path, load in cases:
+            index = VectorIndex()
+            start = time.perf_counter()
+            count = load(index)
+            load_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            match = index.search(query)
+            query_ms = (time.perf_counter() - start) * 1000
+            assert count == args.records, f"{name} loaded {count} records"
+            print(f"{name:15s} {size_mb(path):8.1f} {load_ms:9.1f} {query_ms:12.1f} "
+                  f"{'same' if match[0] == expected[0] else 'differs':>10s}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import asyncio
+from collections import OrderedDict
+import llm
+from tokens import count_tokens
+
+# Prompt budget for session history (the system prompt and the new user turn come on top)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+SUMMARY_MAX_TOKENS = 200
+MAX_CACHED_SUMMARIES = 10000
+
+# user_id -> {"session": session generation, "last": seq of the last summarized message, "text": summary}
+_summaries = OrderedDict()
+_pending = {}
+
+
+def split_history(history, budget=CONTEXT_TOKEN_BUDGET):
+    """Split history into (older, recent) so recent is the longest suffix that fits the budget."""
+    used = 0
+    for i in range(len(history) - 1, -1, -1):
+        used += 4 + count_tokens(history[i]["content"])
+        if used > budget:
+            return history[:i + 1], history[i + 1:]
+    return [], history
+
+
+def _generation(history):
+    # SessionStore tags each message with its session's generation and a per-session seq;
+    # plain lists (e.g. from scripts) fall back to no generation and list positions
+    return history[0].get("session") if history else None
+
+
+def _seq(history, i):
+    return history[i].get("seq", i)
+
+
+def _cached_summary(user_id, session_context):
+    summary = _summaries.get(user_id)
+    if summary and summary["session"] != _generation(session_context):
+        # The session expired and was recreated; its old summary no longer applies
+        del _summaries[user_id]
+        return None
+    return summary
+
+
+async def _summarize(user_id, session_context, older):
+    summary = _cached_summary(user_id, session_context)
+    previous, new_turns = "", older
+    if summary:
+        previous = summary["text"]
+        new_turns = [m for i, m in enumerate(older) if _seq(older, i) > summary["last"]]
+
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in new_turns)
+    prompt = f"""
+    Existing summary of the conversation so far:
+    {previous or "(none)"}
+
+    New messages:
+    {transcript}
+
+    Update the summary so it covers everything above. Keep names, numbers, goals and decisions. Be brief.
+    """
+    try:
+        response = await llm.chat_completion(
+            [{"role": "user", "content": prompt}],
+            max_tokens=SUMMARY_MAX_TOKENS,
+        )
+        _summaries[user_id] = {
+            "session": _generation(session_context),
+            "last": _seq(older, len(older) - 1),
+            "text": response['choices'][0]['message']['content'].strip(),
+        }
+        _summaries.move_to_end(user_id)
+        while len(_summaries) > MAX_CACHED_SUMMARIES:
+            _summaries.popitem(last=False)
+    except Exception as e:
+        print(f"⚠️ Error updating conversation summary: {e}")
+    finally:
+        _pending.pop(user_id, None)
+
+
+def _schedule_summary(user_id, session_context, older):
+    summary = _cached_summary(user_id, session_context)
+    if summary and summary["last"] == _seq(older, len(older) - 1):
+        return  # Already up to date
+    if user_id in _pending:
+        return  # One refresh at a time per user
+    try:
+        _pending[user_id] = asyncio.get_running_loop().create_task(
+            _summarize(user_id, session_context, list(older))
+        )
+    except RuntimeError:
+        pass  # No running loop (e.g. called from a script); skip the summary
+
+
+def build_context(user_id, system_prompt, session_context, user_input, budget=CONTEXT_TOKEN_BUDGET):
+    """Build chat messages: system prompt, cached summary of older turns, recent turns within budget, user turn.
+
+    Turns that no longer fit are folded into a rolling summary refreshed in the
+    background, so the reply never waits on it.
+    """
+    history = session_context
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == user_input:
+        history = history[:-1]  # The caller already recorded this turn in the session
+
+    older, recent = split_history(history, budget)
+
+    messages = [{"role": "system", "content": system_prompt}]
+    if older and user_id is not None:
+        summary = _cached_summary(user_id, session_context)
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary['text']}"})
+        _schedule_summary(user_id, session_context, older)
+
+    messages.extend({"role": m["role"], "content": m["content"]} for m in recent)
+    messages.append({"role": "user", "content": user_input})
+    return messages
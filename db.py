@@ -7,6 +7,15 @@ from dotenv import load_dotenv
 import requests
 import time
 import asyncio
+from itertools import groupby
+from weaviate.util import generate_uuid5
+from vector_index import VectorIndex
+from near_duplicate import NearDuplicateIndex
+from exporter import export_class
+from snapshot import is_snapshot
+from embedding_cache import EmbeddingCache
+from tokens import count_tokens
+import llm
 #from weaviate.classes.init import Auth
 
 load_dotenv()
@@ -16,6 +25,48 @@ WEAVIATE_API_KEY = os.getenv("WEAVIATE_API_KEY")
 
 openai.api_key = OPENAI_TOKEN
 
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Embedding cache (memory LRU + SQLite); entries are keyed by (model, text) so a model change invalidates them
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MEMORY_MB = int(os.getenv("EMBEDDING_CACHE_MEMORY_MB", "64"))
+embedding_cache = EmbeddingCache(
+    EMBEDDING_MODEL, EMBEDDING_CACHE_PATH, max_memory_bytes=EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024
+)
+
+# Bulk ingestion limits
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))  # API hard limit is 300k per request
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "2048"))
+WEAVIATE_BATCH_SIZE = int(os.getenv("WEAVIATE_BATCH_SIZE", "100"))
+WEAVIATE_BATCH_FLUSH_INTERVAL = float(os.getenv("WEAVIATE_BATCH_FLUSH_INTERVAL", "5"))  # seconds
+WEAVIATE_MULTI_QUERY_SIZE = 50  # near-vector queries packed into one GraphQL request
+WEAVIATE_EXPORT_PAGE_SIZE = int(os.getenv("WEAVIATE_EXPORT_PAGE_SIZE", "500"))  # objects per cursor page
+
+# In-process vector index (set USE_LOCAL_INDEX=1 to serve retrieval without Weaviate round trips)
+USE_LOCAL_INDEX = os.getenv("USE_LOCAL_INDEX", "0") == "1"
+# VECTOR_INDEX_SNAPSHOT: a binary snapshot directory (mapped at startup and topped up with objects written to
+# Weaviate since it was synced; rewritten on first run, after a top-up and on shutdown), or a
+# weaviate_export.jsonl / .json export to load from; empty = always load from Weaviate
+VECTOR_INDEX_SNAPSHOT = os.getenv("VECTOR_INDEX_SNAPSHOT", "")
+QA_INDEX_SNAPSHOT = os.getenv("QA_INDEX_SNAPSHOT", "")  # binary snapshot directory for the QAPair index
+VECTOR_SNAPSHOT_DTYPE = os.getenv("VECTOR_SNAPSHOT_DTYPE", "float32")  # float16 halves the file but is converted at load
+VECTOR_SNAPSHOT_OVERLAP = int(os.getenv("VECTOR_SNAPSHOT_OVERLAP", "600"))  # seconds re-checked before a snapshot's sync time
+USER_MATCH_CERTAINTY = 0.75
+ASSISTANT_MATCH_CERTAINTY = 0.7
+
+# Paired Q→A retrieval (set USE_QA_PAIRS=1 once the QAPair class is populated, see migrate_chat_history_to_qa_pairs)
+USE_QA_PAIRS = os.getenv("USE_QA_PAIRS", "0") == "1"
+
+# MinHash/LSH filter that drops obvious repeats before they're embedded (set NEAR_DUP_FILTER=1)
+NEAR_DUP_FILTER = os.getenv("NEAR_DUP_FILTER", "0") == "1"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))  # estimated Jaccard similarity of word shingles
+NEAR_DUP_NUM_PERM = int(os.getenv("NEAR_DUP_NUM_PERM", "128"))
+NEAR_DUP_SHINGLE_SIZE = int(os.getenv("NEAR_DUP_SHINGLE_SIZE", "2"))  # words per shingle
+
+vector_index = VectorIndex()
+qa_index = VectorIndex()  # question vectors → answer text
+near_dup_index = NearDuplicateIndex(NEAR_DUP_THRESHOLD, NEAR_DUP_NUM_PERM, NEAR_DUP_SHINGLE_SIZE)
+
 # Connect to Weaviate Local
 # client = weaviate.Client(
 #     url="http://localhost:8080",  # Use the HTTP endpoint
@@ -48,17 +99,118 @@ def load_chat_json(file_path="chat.json"):
 # Generate embeddings for text
 def generate_embedding(text):
     """Generate and return OpenAI embeddings as a list of floats."""
-    response = openai.Embedding.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    
+    cached = embedding_cache.get(text)
+    if cached is not None:
+        return cached
+
+    response = llm.create_embedding_sync(text, EMBEDDING_MODEL)
+    return _cache_embedding_response(text, response)
+
+
+async def agenerate_embedding(text):
+    """Async version of generate_embedding for use inside event handlers."""
+    cached = embedding_cache.get(text)
+    if cached is not None:
+        return cached
+
+    response = await llm.create_embedding(text, EMBEDDING_MODEL)
+    return _cache_embedding_response(text, response)
+
+
+def _cache_embedding_response(text, response):
     embedding = response["data"][0]["embedding"]
 
     if not isinstance(embedding, list):
         raise ValueError("❌ Embedding is not a list!")
     
-    return [float(x) for x in embedding]  # Ensure all elements are floats
+    embedding = [float(x) for x in embedding]  # Ensure all elements are floats
+    embedding_cache.put(text, embedding)
+    return embedding
+
+
+def pack_embedding_batches(texts):
+    """Group texts into requests bounded by EMBEDDING_BATCH_MAX_TOKENS and EMBEDDING_BATCH_MAX_INPUTS."""
+    batches, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and (current_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS or len(current) >= EMBEDDING_BATCH_MAX_INPUTS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def generate_embeddings(texts):
+    """Embed many texts in as few requests as possible.
+
+    Returns one embedding per input text, in order; an entry is None if its text
+    was empty or its batch failed.
+    """
+    embeddings = {}
+    pending = []
+    for text in dict.fromkeys(texts):  # de-duplicate, keep order
+        if not text or not text.strip():
+            continue
+        cached = embedding_cache.get(text)
+        if cached is not None:
+            embeddings[text] = cached
+        else:
+            pending.append(text)
+
+    batches = pack_embedding_batches(pending)
+    for number, batch in enumerate(batches, 1):
+        try:
+            response = llm.create_embedding_sync(batch, EMBEDDING_MODEL)
+        except Exception as e:
+            print(f"❌ Embedding batch {number}/{len(batches)} failed ({len(batch)} texts): {e}")
+            continue
+
+        batch_embeddings = [(batch[item["index"]], [float(x) for x in item["embedding"]]) for item in response["data"]]
+        embedding_cache.put_many(batch_embeddings)  # one SQLite commit per request
+        embeddings.update(batch_embeddings)
+        print(f"📦 Embedded batch {number}/{len(batches)} ({len(batch)} texts)")
+
+    return [embeddings.get(text) for text in texts]
+
+
+def batch_import(objects, class_name="ChatHistory"):
+    """Write objects through the Weaviate batch API.
+
+    objects is a list of (uuid, data_object, vector) tuples; vector may be None to let
+    Weaviate vectorize. Batches are sent every WEAVIATE_BATCH_SIZE objects or
+    WEAVIATE_BATCH_FLUSH_INTERVAL seconds, whichever comes first. Returns the uuids that failed.
+    """
+    failed = set()
+    progress = {"batches": 0, "sent": 0}
+
+    def report_batch(results):
+        progress["batches"] += 1
+        progress["sent"] += len(results or [])
+        errors = 0
+        for result in results or []:
+            if "result" in result and result["result"].get("errors"):
+                errors += 1
+                failed.add(result.get("id"))
+                print(f"❌ Failed to store {result.get('id')}: {result['result']['errors']}")
+        print(f"📦 Weaviate batch {progress['batches']}: {progress['sent']}/{len(objects)} sent, {errors} failed")
+
+    client.batch.configure(batch_size=WEAVIATE_BATCH_SIZE, dynamic=False, timeout_retries=3, callback=report_batch)
+    last_flush = time.time()
+    try:
+        with client.batch as batch:
+            for object_id, data_object, vector in objects:
+                batch.add_data_object(data_object, class_name, uuid=object_id, vector=vector)
+                if time.time() - last_flush >= WEAVIATE_BATCH_FLUSH_INTERVAL:
+                    batch.flush()
+                    last_flush = time.time()
+    except (requests.exceptions.RequestException, weaviate.exceptions.WeaviateBaseError) as e:
+        print(f"❌ Weaviate batch import interrupted: {e}")
+        failed.update(object_id for object_id, _, _ in objects[progress["sent"]:])
+
+    return failed
 
 
 def format_rfc3339(dt):
@@ -68,31 +220,43 @@ def format_rfc3339(dt):
 
 def store_chat_history():
     chat_data = load_chat_json()
+    timestamp = format_rfc3339(datetime.utcnow())  # ✅ Ensure correct format
+
+    # Embed user queries (and everything else when the local index needs it) in bulk
+    to_embed = [e["content"] if e["role"] == "user" or USE_LOCAL_INDEX else "" for e in chat_data]
+    embeddings = generate_embeddings(to_embed)
 
-    for entry in chat_data:
+    objects = []
+    for entry, embedding in zip(chat_data, embeddings):
         role = entry["role"]
         content = entry["content"]
-        timestamp = format_rfc3339(datetime.utcnow())  # ✅ Ensure correct format
-        print('current_entry_message:', entry["content"])
+        objects.append((
+            generate_uuid5(f"{role}:{content}", "ChatHistory"),
+            {
+                "role": role,
+                "content": content,
+                "timestamp": timestamp,
+                "embedding": embedding if embedding and role == "user" else []
+            },
+            None,
+        ))
+
+    failed = batch_import(objects, "ChatHistory")
+
+    if USE_LOCAL_INDEX:
+        stored = [(o, e) for o, e in zip(objects, embeddings) if o[0] not in failed]
+        vector_index.add_many(
+            [o[1]["role"] for o, _ in stored],
+            [o[1]["content"] for o, _ in stored],
+            [e for _, e in stored],
+            [o[0] for o, _ in stored],
+            [o[1]["timestamp"] for o, _ in stored],
+        )
 
-        # Generate embedding only for user queries
-        embedding = generate_embedding(content) if role == "user" else None  
-        try:
-            client.data_object.create(
-                data_object={
-                    "role": role,
-                    "content": content,
-                    "timestamp": timestamp,  # ✅ Corrected timestamp format
-                    "embedding": embedding if embedding else []  
-                },
-                class_name="ChatHistory"
-            )
-        except requests.exceptions.RequestException as e:
-            print(f"RequestException: {e}")
-        except weaviate.exceptions.UnexpectedStatusCodeException as e:
-            print(f"Weaviate Exception: {e}")
-    
-    print("✅ Chat history successfully stored in Weaviate!")
+    print(f"✅ Chat history stored in Weaviate: {len(objects) - len(failed)} stored, {len(failed)} failed.")
+
+    store_qa_pairs(pair_entries(chat_data), "chat.json")
+    index_near_duplicates([o for o in objects if o[0] not in failed], "content")
 
 
 # Ensure schema exists
@@ -105,7 +269,7 @@ def create_schema():
                 "vectorizer": "text2vec-openai",
                 "moduleConfig": {
                     "text2vec-openai": {
-                        "model": "text-embedding-3-small",
+                        "model": EMBEDDING_MODEL,
                         "type": "text"
                     }
                 },
@@ -115,17 +279,145 @@ def create_schema():
                     {"name": "timestamp", "dataType": ["date"]},
                     {"name": "embedding", "dataType": ["number[]"]}  # ✅ Must be number[]
                 ],
+            },
+            {
+                "class": "QAPair",
+                "description": "A user question linked to the assistant answer that followed it",
+                "vectorizer": "none",  # Object vector is the question embedding, supplied on import
+                "properties": [
+                    {"name": "question", "dataType": ["text"]},
+                    {"name": "answer", "dataType": ["text"]},
+                    {"name": "source", "dataType": ["text"]},
+                    {"name": "timestamp", "dataType": ["date"]}
+                ],
             }
         ]
     }
 
     existing_classes = [c["class"] for c in client.schema.get().get("classes", [])]
-    
-    if "ChatHistory" not in existing_classes:
-        client.schema.create(schema)
-        print("✅ ChatHistory schema created in Weaviate.")
-    else:
-        print("✅ ChatHistory schema already exists.")
+
+    for class_schema in schema["classes"]:
+        if class_schema["class"] not in existing_classes:
+            client.schema.create_class(class_schema)
+            print(f"✅ {class_schema['class']} schema created in Weaviate.")
+        else:
+            print(f"✅ {class_schema['class']} schema already exists.")
+
+
+def pair_entries(entries):
+    """Turn an ordered list of {"role", "content"} turns into (question, answer) pairs.
+
+    Consecutive user turns are joined into one question and consecutive assistant
+    turns into one answer; system turns and unanswered questions are dropped.
+    """
+    pairs = []
+    question, answer = [], []
+    for entry in entries:
+        role, content = entry.get("role"), (entry.get("content") or "").strip()
+        if not content or role not in ("user", "assistant"):
+            continue
+        if role == "user":
+            if answer:
+                pairs.append(("\n".join(question), "\n".join(answer)))
+                question, answer = [], []
+            question.append(content)
+        elif question:
+            answer.append(content)
+    if question and answer:
+        pairs.append(("\n".join(question), "\n".join(answer)))
+    return pairs
+
+
+def store_qa_pairs(pairs, source, skip_known=False):
+    """Embed each question and write the pairs to the QAPair class (question vector = object vector).
+
+    With skip_known, questions that already get a stored answer are dropped first:
+    near-duplicates of stored text before embedding, then semantic matches.
+    """
+    if skip_known and NEAR_DUP_FILTER:
+        fresh = [p for p in pairs if not is_near_duplicate(p[0])]
+        if len(fresh) < len(pairs):
+            print(f"⏭️ Skipped {len(pairs) - len(fresh)} Q&A pairs that repeat stored text.")
+        pairs = fresh
+
+    if not pairs:
+        return set()
+
+    timestamp = format_rfc3339(datetime.utcnow())
+    embeddings = generate_embeddings([question for question, _ in pairs])
+
+    if skip_known:
+        known = match_entries([e for e in embeddings if e])
+        known_iter = iter(known)
+        keep = [not e or next(known_iter)[0] is None for e in embeddings]
+        skipped = keep.count(False)
+        pairs = [p for p, k in zip(pairs, keep) if k]
+        embeddings = [e for e, k in zip(embeddings, keep) if k]
+        if skipped:
+            print(f"⏭️ Skipped {skipped} Q&A pairs that are already known.")
+
+    objects = []
+    for (question, answer), embedding in zip(pairs, embeddings):
+        if not embedding:
+            print(f"❌ No embedding for question, skipping pair: {question[:100]}")
+            continue
+        objects.append((
+            generate_uuid5(f"{question}:{answer}", "QAPair"),
+            {"question": question, "answer": answer, "source": source, "timestamp": timestamp},
+            embedding,
+        ))
+
+    failed = batch_import(objects, "QAPair")
+
+    if USE_LOCAL_INDEX:
+        stored = [o for o in objects if o[0] not in failed]
+        qa_index.add_many(
+            ["QAPair"] * len(stored), [o[1]["answer"] for o in stored], [o[2] for o in stored], [o[0] for o in stored],
+            [o[1]["timestamp"] for o in stored],
+        )
+    index_near_duplicates([o for o in objects if o[0] not in failed], "question")
+
+    print(f"✅ Stored {len(objects) - len(failed)} Q&A pairs from {source} ({len(failed)} failed).")
+    return failed
+
+
+def migrate_chat_history_to_qa_pairs(page_size=500):
+    """Rebuild QAPair from the existing ChatHistory objects.
+
+    ChatHistory has no sequence number, so turns can only be ordered by timestamp. Turns
+    sharing a timestamp (e.g. one bulk import, where ids are content hashes) have no
+    recoverable order, so they are left out and pairing restarts after them. Re-run
+    store_chat_history / store_qa_in_weaviate to pair those from their source files.
+    """
+    records, cursor = [], None
+    while True:
+        query = client.query.get("ChatHistory", ["role", "content", "timestamp", "_additional { id }"]).with_limit(page_size)
+        if cursor:
+            query = query.with_after(cursor)
+        page = query.do().get("data", {}).get("Get", {}).get("ChatHistory") or []
+        if not page:
+            break
+        records.extend(page)
+        cursor = page[-1]["_additional"]["id"]
+
+    records.sort(key=lambda r: r.get("timestamp") or "")
+    pairs, run, skipped = [], [], 0
+    for timestamp, group in groupby(records, key=lambda r: r.get("timestamp")):
+        group = list(group)
+        if timestamp and len(group) == 1:
+            run.append(group[0])
+            continue
+        # Order within the group is unknown: pairing across it could match the wrong answer
+        skipped += len(group)
+        pairs.extend(pair_entries(run))
+        run = []
+    pairs.extend(pair_entries(run))
+
+    if skipped:
+        print(f"⚠️ Skipped {skipped} ChatHistory objects that share a timestamp, so their order is unknown. "
+              "Re-import their source files with store_chat_history / store_qa_in_weaviate to pair them.")
+    print(f"🔁 Migrating {len(records) - skipped} ChatHistory objects into {len(pairs)} Q&A pairs...")
+    return store_qa_pairs(pairs, "ChatHistory migration")
 
 
 # Store a conversation entry in Weaviate
@@ -136,18 +428,24 @@ def store_conversation_entry(role, content, message_id):
         return
 
     try:
-        embedding = generate_embedding(content) if role == "user" else None
+        embedding = generate_embedding(content) if role == "user" or USE_LOCAL_INDEX else None
+        timestamp = format_rfc3339(datetime.utcnow())
 
-        client.data_object.create(
+        object_id = client.data_object.create(
             data_object={
                 "role": role,
                 "content": content,
-                "timestamp": format_rfc3339(datetime.utcnow()),
+                "timestamp": timestamp,
                 "message_id": message_id,
-                **({"embedding": embedding} if embedding else {})
+                **({"embedding": embedding} if embedding and role == "user" else {})
             },
             class_name="ChatHistory"  # Ensure class name is consistent
         )
+
+        if USE_LOCAL_INDEX:
+            vector_index.add(role, content, embedding, object_id, timestamp)
+        if NEAR_DUP_FILTER:
+            near_dup_index.add(object_id, content)
     except weaviate.exceptions.UnexpectedStatusCodeException as e:
         print(f"❌ Error storing in Weaviate: {e}")
     except Exception as e:
@@ -204,14 +502,164 @@ def store_conversation_entry(role, content, message_id):
 #     return None  # No similar user query or assistant response found
 
 
+def _load_index(index, snapshot, load_remote, catch_up):
+    """Map the binary snapshot if there is one and fetch what was written to Weaviate since it was
+    synced; otherwise load from Weaviate and write the snapshot so the next start can map it.
+    Returns (count, source)."""
+    if snapshot and is_snapshot(snapshot):
+        count = index.load_binary_snapshot(snapshot)
+        added = catch_up()
+        if added:
+            # Saved right away: the shutdown save doesn't run when the process is killed
+            index.save_binary_snapshot(snapshot, VECTOR_SNAPSHOT_DTYPE)
+            print(f"💾 Added {added} objects written since the snapshot and saved it again.")
+        return count + added, snapshot
+
+    count = load_remote()
+    if snapshot:
+        index.save_binary_snapshot(snapshot, VECTOR_SNAPSHOT_DTYPE)
+        print(f"💾 Saved a snapshot of {count} vectors to {snapshot}.")
+    return count, "Weaviate"
+
+
+def load_vector_index():
+    """Fill the in-process index from the configured snapshot, or from Weaviate if none is set."""
+    if not USE_LOCAL_INDEX or len(vector_index) or len(qa_index):
+        return len(vector_index) + len(qa_index)
+
+    start = time.time()
+    if USE_QA_PAIRS:
+        count, source = _load_index(
+            qa_index, QA_INDEX_SNAPSHOT,
+            lambda: qa_index.load_from_weaviate(client, "QAPair", content_field="answer", role_field=None),
+            lambda: qa_index.catch_up_from_weaviate(
+                client, "QAPair", VECTOR_SNAPSHOT_OVERLAP, content_field="answer", role_field=None
+            ),
+        )
+        print(f"✅ Loaded {count} Q&A pairs into the local index from {source} in {time.time() - start:.2f}s.")
+        return count
+
+    if VECTOR_INDEX_SNAPSHOT.endswith(".jsonl") and os.path.exists(VECTOR_INDEX_SNAPSHOT):
+        count = vector_index.load_export(VECTOR_INDEX_SNAPSHOT[:-len(".jsonl")])
+        source = VECTOR_INDEX_SNAPSHOT
+    elif VECTOR_INDEX_SNAPSHOT.endswith(".json") and os.path.exists(VECTOR_INDEX_SNAPSHOT):
+        count = vector_index.load_snapshot(VECTOR_INDEX_SNAPSHOT, embed=generate_embeddings)
+        source = VECTOR_INDEX_SNAPSHOT
+    else:
+        snapshot = "" if VECTOR_INDEX_SNAPSHOT.endswith((".json", ".jsonl")) else VECTOR_INDEX_SNAPSHOT
+        count, source = _load_index(
+            vector_index, snapshot,
+            lambda: vector_index.load_from_weaviate(client, "ChatHistory"),
+            lambda: vector_index.catch_up_from_weaviate(client, "ChatHistory", VECTOR_SNAPSHOT_OVERLAP),
+        )
+
+    print(f"✅ Loaded {count} vectors into the local index from {source} in {time.time() - start:.2f}s.")
+    return count
+
+
+def save_vector_index():
+    """Rewrite the configured binary snapshots so entries learned since startup survive a restart."""
+    if not USE_LOCAL_INDEX:
+        return
+    for index, snapshot in ((vector_index, VECTOR_INDEX_SNAPSHOT), (qa_index, QA_INDEX_SNAPSHOT)):
+        if not snapshot or snapshot.endswith((".json", ".jsonl")) or not len(index):
+            continue
+        try:
+            count = index.save_binary_snapshot(snapshot, VECTOR_SNAPSHOT_DTYPE)
+            print(f"💾 Saved a snapshot of {count} vectors to {snapshot}.")
+        except Exception as e:
+            print(f"❌ Failed to save vector index snapshot {snapshot}: {e}")
+
+
+def load_near_duplicate_index():
+    """Fill the near-duplicate filter from stored ChatHistory content and QAPair questions."""
+    if not NEAR_DUP_FILTER or len(near_dup_index):
+        return len(near_dup_index)
+
+    start = time.time()
+    count = near_dup_index.load_from_weaviate(client, "ChatHistory", "content")
+    if USE_QA_PAIRS:
+        count += near_dup_index.load_from_weaviate(client, "QAPair", "question")
+    print(f"✅ Loaded {count} texts into the near-duplicate filter in {time.time() - start:.2f}s.")
+    return count
+
+
+def index_near_duplicates(objects, text_field):
+    """Add freshly stored (uuid, data_object, vector) tuples to the near-duplicate filter."""
+    if NEAR_DUP_FILTER:
+        near_dup_index.add_many([o[0] for o in objects], [o[1][text_field] for o in objects])
+
+
+def is_near_duplicate(text):
+    """True if text repeats something already stored (no embedding needed)."""
+    return NEAR_DUP_FILTER and near_dup_index.is_duplicate(text)
+
+
+def find_most_similar_entry_local(query_embedding):
+    """Same lookup as find_most_similar_entry, served from the in-process index."""
+    if USE_QA_PAIRS:
+        match = qa_index.search(query_embedding, certainty=USER_MATCH_CERTAINTY)
+        return match[0] if match else None
+
+    matches = vector_index.search_roles(query_embedding, {
+        "user": USER_MATCH_CERTAINTY,
+        "assistant": ASSISTANT_MATCH_CERTAINTY,
+    })
+    if not matches["user"]:
+        print("❌ No similar user entries found.")
+        return None
+
+    assistant_match = matches["assistant"]
+    if not assistant_match:
+        print("❌ No assistant response found.")
+        return None
+
+    return assistant_match[0]
+
+
+def _near_qa_pair_query(vector, certainty):
+    """Blocking near-vector query over QAPair question vectors; returns the best answer or None."""
+    response = client.query.get(
+        "QAPair", ["question", "answer", "source"]
+    ).with_near_vector({
+        "vector": vector,
+        "certainty": certainty
+    }).with_limit(1).do()
+
+    pairs = response.get("data", {}).get("Get", {}).get("QAPair") or []
+    return pairs[0]["answer"] if pairs else None
+
+
+def _near_vector_query(vector, role, certainty, fields, limit=1):
+    """Blocking role-filtered near-vector query; run it through asyncio.to_thread from handlers."""
+    return client.query.get(
+        "ChatHistory", fields
+    ).with_near_vector({
+        "vector": vector,
+        "certainty": certainty
+    }).with_where({
+        "operator": "Equal",
+        "path": ["role"],
+        "valueText": role
+    }).with_limit(limit).do()
+
+
 # Query Weaviate to Find Similar Messages Online
-async def find_most_similar_entry(query_text):
-    """Find the most relevant assistant response based on user query."""
-    query_embedding = generate_embedding(query_text)
+async def find_most_similar_entry(query_text, query_embedding=None):
+    """Find the most relevant assistant response based on user query.
+
+    Pass query_embedding when the caller already embedded query_text.
+    """
+    if query_embedding is None:
+        query_embedding = await agenerate_embedding(query_text)
+
+    if USE_LOCAL_INDEX:
+        return find_most_similar_entry_local(query_embedding)
+
+    if USE_QA_PAIRS:
+        # One query: the matched question carries its own answer
+        return await asyncio.to_thread(_near_qa_pair_query, query_embedding, USER_MATCH_CERTAINTY)
 
-    # Check if embeddings exist for the stored data
-    response = await asyncio.to_thread(client.query.get, "ChatHistory", ["role", "content", "embedding"])
-    response = response.do()
     # print("Embedding Check:")
     # embedding_exists = False
     # for record in response["data"]["Get"]["ChatHistory"]:
@@ -227,17 +675,8 @@ async def find_most_similar_entry(query_text):
 
     # Perform vector search directly to find the most similar user query
     response = await asyncio.to_thread(
-        client.query.get, 
-        "ChatHistory", ["role", "content", "_additional { id }"]
+        _near_vector_query, query_embedding, "user", USER_MATCH_CERTAINTY, ["role", "content", "_additional { id }"]
     )
-    response = response.with_near_vector({
-        "vector": query_embedding,
-        "certainty": 0.75
-    }).with_where({
-        "operator": "Equal",
-        "path": ["role"],
-        "valueText": "user"
-    }).with_limit(1).do()
 
     print("Filtered Search Response:", response)
 
@@ -253,17 +692,8 @@ async def find_most_similar_entry(query_text):
         # Use the same query embedding to find the most relevant assistant response
         print("\nPerforming Vector Search for Most Relevant Assistant Response:")
         response = await asyncio.to_thread(
-            client.query.get, 
-            "ChatHistory", ["role", "content"]
+            _near_vector_query, query_embedding, "assistant", ASSISTANT_MATCH_CERTAINTY, ["role", "content"]
         )
-        response = response.with_near_vector({
-            "vector": query_embedding,
-            "certainty": 0.7  # Adjust if needed
-        }).with_where({
-            "operator": "Equal",
-            "path": ["role"],
-            "valueText": "assistant"
-        }).with_limit(1).do()
 
         print("Most Relevant Assistant Response:", response)
 
@@ -279,6 +709,85 @@ async def find_most_similar_entry(query_text):
     return None
 
 
+def _multi_near_vector_query(class_name, fields, vectors, certainty, where=None):
+    """Best object per vector, using aliased near-vector queries packed into few GraphQL requests."""
+    best = []
+    for start in range(0, len(vectors), WEAVIATE_MULTI_QUERY_SIZE):
+        queries = []
+        for i, vector in enumerate(vectors[start:start + WEAVIATE_MULTI_QUERY_SIZE]):
+            query = client.query.get(
+                class_name, fields + ["_additional { id certainty }"]
+            ).with_near_vector({
+                "vector": vector,
+                "certainty": certainty
+            }).with_limit(1).with_alias(f"q{i}")
+            if where:
+                query = query.with_where(where)
+            queries.append(query)
+
+        data = client.query.multi_get(queries).do().get("data", {}).get("Get", {})
+        best.extend((data.get(f"q{i}") or [None])[0] for i in range(len(queries)))
+    return best
+
+
+def match_entries(query_embeddings):
+    """Blocking core of find_most_similar_entries: one (answer, certainty) or (None, None) per vector."""
+    if not query_embeddings:
+        return []
+
+    if USE_LOCAL_INDEX:
+        if USE_QA_PAIRS:
+            matches = qa_index.search_many(query_embeddings, {None: USER_MATCH_CERTAINTY})
+            return [(m[None][0], m[None][2]) if m[None] else (None, None) for m in matches]
+
+        matches = vector_index.search_many(query_embeddings, {
+            "user": USER_MATCH_CERTAINTY,
+            "assistant": ASSISTANT_MATCH_CERTAINTY,
+        })
+        return [
+            (m["assistant"][0], m["user"][2]) if m["user"] and m["assistant"] else (None, None)
+            for m in matches
+        ]
+
+    if USE_QA_PAIRS:
+        pairs = _multi_near_vector_query("QAPair", ["answer"], query_embeddings, USER_MATCH_CERTAINTY)
+        return [(p["answer"], p["_additional"]["certainty"]) if p else (None, None) for p in pairs]
+
+    role_filter = lambda role: {"operator": "Equal", "path": ["role"], "valueText": role}
+    users = _multi_near_vector_query("ChatHistory", ["content"], query_embeddings, USER_MATCH_CERTAINTY, role_filter("user"))
+    # Only queries that matched a user turn need the assistant lookup
+    matched = [i for i, u in enumerate(users) if u]
+    assistants = _multi_near_vector_query(
+        "ChatHistory", ["content"], [query_embeddings[i] for i in matched], ASSISTANT_MATCH_CERTAINTY, role_filter("assistant")
+    )
+
+    results = [(None, None)] * len(query_embeddings)
+    for i, assistant in zip(matched, assistants):
+        if assistant:
+            results[i] = (assistant["content"], users[i]["_additional"]["certainty"])
+    return results
+
+
+async def find_most_similar_entries(query_texts, query_embeddings=None):
+    """Batch version of find_most_similar_entry.
+
+    Embeds all texts in batched requests and scores them in one matrix operation
+    (local index) or a few multi-query GraphQL requests. Returns one
+    (answer, certainty) tuple per text, (None, None) where nothing matched.
+    """
+    if query_embeddings is None:
+        query_embeddings = await asyncio.to_thread(generate_embeddings, query_texts)
+
+    # Texts whose embedding failed can't be matched
+    valid = [i for i, e in enumerate(query_embeddings) if e]
+    matches = await asyncio.to_thread(match_entries, [query_embeddings[i] for i in valid])
+
+    results = [(None, None)] * len(query_texts)
+    for i, match in zip(valid, matches):
+        results[i] = match
+    return results
+
+
 def retrieve_conversation_history(user_query, limit=50):
     """Retrieve the most relevant past messages from Weaviate using vector search."""
     query_embedding = generate_embedding(user_query)
@@ -325,13 +834,16 @@ def retrieve_conversation_history(user_query, limit=50):
 #         print(f"Error storing Q&A in Weaviate: {e}")
 
 
-def store_qa_in_weaviate(qa_conversation):
-    """Stores Q&A dialogue in Weaviate with enhanced error handling."""
+def store_qa_in_weaviate(qa_conversation, source="video"):
+    """Stores Q&A dialogue in Weaviate with enhanced error handling.
+
+    Returns True only if every entry and Q&A pair was stored.
+    """
     try:
         # Check if qa_conversation is None or empty
         if not qa_conversation:
             print("❌ Error: qa_conversation is None or empty.")
-            return
+            return False
 
         # Check if qa_conversation is a string and print a snippet for debugging
         if isinstance(qa_conversation, str):
@@ -342,85 +854,74 @@ def store_qa_in_weaviate(qa_conversation):
             qa_pairs = qa_conversation  # Already a list of dicts
         else:
             print(f"❌ Invalid input type: {type(qa_conversation)}. Expected str or list.")
-            return
+            return False
 
         # Check if qa_pairs is a list and has valid entries
         if not isinstance(qa_pairs, list) or not qa_pairs:
             print("❌ No valid Q&A data to store.")
-            return
+            return False
 
+        timestamp = format_rfc3339(datetime.utcnow())
+        objects = []
         for entry in qa_pairs:
             role = entry.get("role")
             content = entry.get("content")
-            timestamp = datetime.utcnow().isoformat()
 
             # Check for missing required fields
             if not role or not content:
                 print(f"❌ Missing required fields in entry: {entry}")
                 continue
 
-            # Store each Q&A entry in Weaviate
-            try:
-                client.data_object.create(
-                    data_object={
-                        "role": role,
-                        "content": content,
-                        "timestamp": timestamp
-                    },
-                    class_name="ChatHistory"
-                )
-            except weaviate.exceptions.UnexpectedStatusCodeException as e:
-                print(f"❌ Error storing entry in Weaviate: {e}")
-            except Exception as e:
-                print(f"❌ Unexpected error storing entry: {e}")
-
-        print(f"✅ Stored {len(qa_pairs)} Q&A entries in Weaviate.")
+            objects.append((
+                generate_uuid5(f"{role}:{content}", "ChatHistory"),
+                {
+                    "role": role,
+                    "content": content,
+                    "timestamp": timestamp
+                },
+                None,
+            ))
+
+        # Store all Q&A entries through the batch API
+        failed = batch_import(objects, "ChatHistory")
+
+        if USE_LOCAL_INDEX:
+            stored = [o for o in objects if o[0] not in failed]
+            vector_index.add_many(
+                [o[1]["role"] for o in stored],
+                [o[1]["content"] for o in stored],
+                generate_embeddings([o[1]["content"] for o in stored]),
+                [o[0] for o in stored],
+                [o[1]["timestamp"] for o in stored],
+            )
+
+        print(f"✅ Stored {len(objects) - len(failed)} Q&A entries in Weaviate ({len(failed)} failed).")
+
+        # Only QAPair lookups can dedupe here; ChatHistory lookups would match the turns just stored,
+        # so they only enter the near-duplicate index afterwards
+        failed_pairs = store_qa_pairs(pair_entries(qa_pairs), source, skip_known=USE_QA_PAIRS)
+        index_near_duplicates([o for o in objects if o[0] not in failed], "content")
+        return not failed and not failed_pairs
 
     except json.JSONDecodeError as e:
         print(f"❌ JSON Decode Error: {e}")
         print(f"❌ Raw JSON content: {qa_conversation[:500]}")  # Print first 500 chars for debugging
     except Exception as e:
         print(f"❌ Error storing Q&A in Weaviate: {e}")
+    return False
 
 
 
 
-def export_weaviate_data(class_name="ChatHistory"):
-    """Exports data from Weaviate and saves it to a JSON file."""
-    query = f"""
-    {{
-      Get {{
-        {class_name} {{
-          role
-          content
-          timestamp
-          embedding  # Export embeddings if available
-        }}
-      }}
-    }}
-    """
-
+def export_weaviate_data(class_name="ChatHistory", prefix=None, page_size=WEAVIATE_EXPORT_PAGE_SIZE, resume=True):
+    """Streams every object of a class to <prefix>.jsonl plus <prefix>.vectors.f32 (see exporter.py)."""
+    prefix = prefix or ("weaviate_export" if class_name == "ChatHistory" else f"weaviate_export_{class_name}")
     try:
-        # Run the query to get data from Weaviate
-        response = client.query.raw(query)
-        
-        # Print the full response if 'data' key is missing
-        if 'data' not in response:
-            print(f"❌ No 'data' key in response. Full response: {response}")
-            return
-
-        data = response['data']['Get'].get(class_name, [])
-        
-        if not data:
-            print(f"❌ No data found for class '{class_name}'. Full response: {response}")
-            return
-        
-        # Save the data to a JSON file
-        with open('weaviate_export.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        
-        print("\n✅ Data successfully exported to 'weaviate_export.json'")
-    
+        start = time.time()
+        state = export_class(client, class_name, prefix, page_size=page_size, resume=resume)
+        print(f"\n✅ Exported {state['records']} {class_name} records ({state['vectors']} vectors) "
+              f"to '{prefix}.jsonl' in {time.time() - start:.2f}s")
+        return state
     except weaviate.exceptions.WeaviateException as e:
         print(f"❌ Weaviate error during export: {e}")
     except Exception as e:
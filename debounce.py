@@ -0,0 +1,78 @@
+import time
+import asyncio
+
+
+class MessageCoalescer:
+    """Per-user debounce: message fragments that arrive close together are handled as one turn.
+
+    A message from an author who sent nothing in the last `window` seconds is handled
+    right away, so single messages never wait. Once a second one arrives within the window,
+    a batch is flushed when no new fragment arrives for `window` seconds, `max_wait`
+    seconds after its first fragment, or when it reaches `max_batch` fragments. If a
+    fragment arrives while the previous batch is still being processed and that batch
+    hasn't committed (see commit), the in-flight work is cancelled and its fragments
+    are merged into the new batch.
+    """
+
+    def __init__(self, handler, window=1.5, max_wait=4.0, max_batch=5):
+        self.handler = handler  # async callable taking the list of messages in a batch
+        self.window = window
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._pending = {}  # key -> [messages, first arrival, flush timer]
+        self._inflight = {}  # key -> [task, messages, committed]
+        self._last_seen = {}  # key -> arrival of its latest fragment
+        self.stats = {"fragments": 0, "batches": 0, "superseded": 0}
+
+    def submit(self, key, message):
+        """Add a message fragment for key (normally the author id)."""
+        self.stats["fragments"] += 1
+        now = time.monotonic()
+
+        last_seen = self._last_seen.get(key)
+        self._last_seen[key] = now
+        if len(self._last_seen) > 10000:
+            self._last_seen = {k: t for k, t in self._last_seen.items() if now - t <= self.window}
+        burst = last_seen is not None and now - last_seen <= self.window
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = [[], now, None]
+            inflight = self._inflight.get(key)
+            if inflight and not inflight[0].done() and not inflight[2]:
+                inflight[0].cancel()
+                pending[0].extend(inflight[1])
+                self.stats["superseded"] += 1
+
+        pending[0].append(message)
+        if pending[2]:
+            pending[2].cancel()
+
+        if len(pending[0]) >= self.max_batch or not burst:
+            delay = 0.0
+        else:
+            delay = max(0.0, min(self.window, self.max_wait - (now - pending[1])))
+        pending[2] = asyncio.get_running_loop().create_task(self._flush_after(key, delay))
+
+    def commit(self, key):
+        """Mark the in-flight batch for key as past the point of no return (it has started replying)."""
+        inflight = self._inflight.get(key)
+        if inflight:
+            inflight[2] = True
+
+    async def _flush_after(self, key, delay):
+        await asyncio.sleep(delay)
+        messages = self._pending.pop(key)[0]
+        self.stats["batches"] += 1
+        task = asyncio.get_running_loop().create_task(self._run(key, messages))
+        self._inflight[key] = [task, messages, False]
+
+    async def _run(self, key, messages):
+        try:
+            await self.handler(messages)
+        except asyncio.CancelledError:
+            print(f"✂️ Superseded {len(messages)} message(s) from {key}, merging with newer ones.")
+        finally:
+            inflight = self._inflight.get(key)
+            if inflight and inflight[0] is asyncio.current_task():
+                del self._inflight[key]
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+
+def cache_key(model, text):
+    """Content address of an embedding: sha256 over (model, text)."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: an in-memory LRU bounded by bytes, backed by SQLite on disk."""
+
+    def __init__(self, model, path="embedding_cache.sqlite3", max_memory_bytes=64 * 1024 * 1024):
+        self.model = model
+        self.path = path
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_bytes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        # Vectors from any other model are stale once EMBEDDING_MODEL changes
+        stale = self._db.execute("DELETE FROM embeddings WHERE model != ?", (self.model,)).rowcount
+        self._db.commit()
+        if stale:
+            print(f"🧹 Dropped {stale} cached embeddings from a previous embedding model.")
+
+    def _remember(self, key, vector):
+        size = vector.itemsize * len(vector)
+        if key in self._memory:
+            return
+        self._memory[key] = vector
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_bytes -= evicted.itemsize * len(evicted)
+            self.stats["evictions"] += 1
+
+    def get(self, text):
+        """Return the cached embedding for text as a list of floats, or None."""
+        key = cache_key(self.model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return vector.tolist()
+
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row:
+                    vector = array("f")
+                    vector.frombytes(row[0])
+                    self._remember(key, vector)
+                    self.stats["disk_hits"] += 1
+                    return vector.tolist()
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, text, embedding):
+        """Store an embedding in both tiers."""
+        self.put_many([(text, embedding)])
+
+    def put_many(self, items):
+        """Store several (text, embedding) pairs in both tiers with a single SQLite commit."""
+        rows = [(cache_key(self.model, text), array("f", embedding)) for text, embedding in items]
+        if not rows:
+            return
+        with self._lock:
+            for key, vector in rows:
+                self._remember(key, vector)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                    [(key, self.model, vector.tobytes()) for key, vector in rows],
+                )
+                self._db.commit()
+
+    def hit_rate(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
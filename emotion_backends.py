@@ -0,0 +1,167 @@
+import os
+from collections import namedtuple
+import numpy as np
+
+EMOTION_LANG = "en"
+EMOTION_MAX_LENGTH = 128  # tokens, as in pysentimiento
+EMOTION_MODEL_DIR = os.getenv("EMOTION_MODEL_DIR", "models")  # exported ONNX graphs are cached here
+
+EmotionResult = namedtuple("EmotionResult", ["sentence", "probas"])
+
+
+def _model_info(lang=EMOTION_LANG):
+    """pysentimiento's default emotion model name and tweet preprocessing arguments for lang."""
+    from pysentimiento.analyzer import models
+    info = models[lang]["emotion"]
+    return info["model_name"], {**info.get("preprocessing_args", {}), "lang": lang}
+
+
+class AnalyzerEmotionBackend:
+    """pysentimiento's own analyzer, create_analyzer(...).predict (the default and the reference for the others)."""
+
+    name = "torch"
+
+    def __init__(self, lang=EMOTION_LANG):
+        from pysentimiento import create_analyzer
+        self.analyzer = create_analyzer(task="emotion", lang=lang)
+
+    def predict(self, texts):
+        """Return pysentimiento's output (with .probas) for a text, or one per text for a list."""
+        return self.analyzer.predict(texts)
+
+
+class TorchEmotionBackend:
+    """The pysentimiento emotion model in full-precision PyTorch, batched by hand.
+
+    Batches are tokenized with padding and run in one forward pass, skipping the
+    Trainer/Dataset machinery pysentimiento uses for list inputs. Check it against
+    the default with bench_emotion_backends.py before switching to it.
+    """
+
+    name = "torch-batched"
+
+    def __init__(self, lang=EMOTION_LANG):
+        from transformers import AutoConfig, AutoTokenizer
+        from pysentimiento.preprocessing import preprocess_tweet
+
+        self.model_name, self.preprocessing_args = _model_info(lang)
+        self._preprocess = preprocess_tweet
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        config = AutoConfig.from_pretrained(self.model_name)
+        self.id2label = {int(i): label for i, label in config.id2label.items()}
+        self.multilabel = config.problem_type == "multi_label_classification"
+        self._load_model()
+
+    def _load_model(self):
+        from transformers import AutoModelForSequenceClassification
+        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name).eval()
+
+    def _logits(self, encoded):
+        import torch
+        with torch.inference_mode():
+            return self.model(**{k: torch.from_numpy(v) for k, v in encoded.items()}).logits.numpy()
+
+    def predict(self, texts):
+        """Return one EmotionResult (with .probas like pysentimiento's output) per text."""
+        if isinstance(texts, str):
+            return self.predict([texts])[0]
+
+        sentences = [self._preprocess(text, **self.preprocessing_args) for text in texts]
+        encoded = self.tokenizer(
+            sentences, padding=True, truncation=True, max_length=EMOTION_MAX_LENGTH, return_tensors="np"
+        )
+        logits = self._logits(dict(encoded)).astype(np.float64)
+        if self.multilabel:
+            probs = 1 / (1 + np.exp(-logits))
+        else:
+            probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs /= probs.sum(axis=1, keepdims=True)
+        return [
+            EmotionResult(sentence, {self.id2label[i]: float(p[i]) for i in self.id2label})
+            for sentence, p in zip(sentences, probs)
+        ]
+
+
+class QuantizedTorchEmotionBackend(TorchEmotionBackend):
+    """PyTorch with dynamic int8 quantization of the Linear layers (weights int8, activations quantized per batch)."""
+
+    name = "int8"
+
+    def _load_model(self):
+        import torch
+        super()._load_model()
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxEmotionBackend(TorchEmotionBackend):
+    """ONNX Runtime on the CPU, from a graph exported once and cached in EMOTION_MODEL_DIR."""
+
+    name = "onnx"
+    quantize = False
+
+    def _graph_path(self, quantized):
+        suffix = "-int8" if quantized else ""
+        return os.path.join(EMOTION_MODEL_DIR, f"{self.model_name.replace('/', '__')}{suffix}.onnx")
+
+    def _export(self, path):
+        import torch
+        super()._load_model()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        sample = self.tokenizer(["export sample"], return_tensors="pt")
+        names = list(sample.keys())
+        tmp_path = f"{path}.tmp"
+        torch.onnx.export(
+            self.model,
+            ({n: sample[n] for n in names},),  # a trailing dict is passed as keyword arguments
+            tmp_path,
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes={**{n: {0: "batch", 1: "sequence"} for n in names}, "logits": {0: "batch"}},
+            opset_version=14,
+        )
+        del self.model  # only needed for the export
+        os.replace(tmp_path, path)
+        print(f"📦 Exported emotion model to {path}.")
+
+    def _load_model(self):
+        import onnxruntime as ort
+
+        path = self._graph_path(self.quantize)
+        if not os.path.exists(path):
+            if self.quantize:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                float_path = self._graph_path(False)
+                if not os.path.exists(float_path):
+                    self._export(float_path)
+                quantize_dynamic(float_path, path, weight_type=QuantType.QInt8)
+            else:
+                self._export(path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _logits(self, encoded):
+        return self.session.run(None, {n: encoded[n].astype(np.int64) for n in self.input_names})[0]
+
+
+class QuantizedOnnxEmotionBackend(OnnxEmotionBackend):
+    """ONNX Runtime with the exported graph dynamically quantized to int8."""
+
+    name = "onnx-int8"
+    quantize = True
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (AnalyzerEmotionBackend, TorchEmotionBackend, QuantizedTorchEmotionBackend,
+                    OnnxEmotionBackend, QuantizedOnnxEmotionBackend)
+}
+
+
+def load_backend(name="torch", lang=EMOTION_LANG):
+    """Build the named emotion backend (see BACKENDS)."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown emotion backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](lang)
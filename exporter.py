@@ -0,0 +1,121 @@
+import os
+import json
+import numpy as np
+
+# An export with prefix P is three files:
+#   P.jsonl        one object per line: {"id", <properties>..., "vector_row": row in P.vectors.f32 or null}
+#   P.vectors.f32  object vectors as raw little-endian float32, `dim` values per row
+#   P.state.json   cursor and file sizes after the last complete page, for resuming
+
+
+def export_paths(prefix):
+    return f"{prefix}.jsonl", f"{prefix}.vectors.f32", f"{prefix}.state.json"
+
+
+def _scalar_properties(client, class_name):
+    """Names of the class's properties, minus number arrays (vectors are exported separately)."""
+    schema = client.schema.get(class_name)
+    return [p["name"] for p in schema.get("properties", []) if p["dataType"] != ["number[]"]]
+
+
+def _save_state(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def export_class(client, class_name, prefix, page_size=500, fields=None, resume=True):
+    """Stream every object of a Weaviate class to JSON Lines plus a binary vector file.
+
+    Walks the class with a cursor (`after` + limit), so memory stays at one page no
+    matter how large the class is. After each page the files are flushed and the
+    cursor saved; with resume=True an unfinished export continues from there.
+    Returns the state dict (records, vectors, dim, complete...).
+    """
+    jsonl_path, vectors_path, state_path = export_paths(prefix)
+    fields = fields or _scalar_properties(client, class_name)
+
+    state = None
+    if resume and os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("complete") or state.get("class_name") != class_name or state.get("fields") != fields:
+            state = None  # Finished or different export: start over
+    if state is None:
+        state = {"class_name": class_name, "fields": fields, "cursor": None, "records": 0, "vectors": 0,
+                 "dim": None, "jsonl_bytes": 0, "complete": False}
+    elif state["cursor"]:
+        print(f"⏩ Resuming export of {class_name} after {state['records']} records.")
+
+    # Drop anything written after the last saved page (e.g. a crash mid-page)
+    mode = "r+b" if state["records"] else "wb"
+    with open(jsonl_path, mode) as jsonl, open(vectors_path, mode) as vectors:
+        jsonl.truncate(state["jsonl_bytes"])
+        jsonl.seek(state["jsonl_bytes"])
+        vector_bytes = state["vectors"] * (state["dim"] or 0) * 4
+        vectors.truncate(vector_bytes)
+        vectors.seek(vector_bytes)
+
+        while True:
+            query = client.query.get(class_name, fields + ["_additional { id vector }"]).with_limit(page_size)
+            if state["cursor"]:
+                query = query.with_after(state["cursor"])
+            response = query.do()
+            if "errors" in response:
+                raise RuntimeError(f"Weaviate export query failed: {response['errors']}")
+
+            records = response.get("data", {}).get("Get", {}).get(class_name) or []
+            if not records:
+                break
+
+            lines = []
+            page_vectors = []
+            cursor = records[-1]["_additional"]["id"]
+            for record in records:
+                additional = record.pop("_additional")
+                vector = additional.get("vector")
+                row = None
+                if vector:
+                    if state["dim"] is None:
+                        state["dim"] = len(vector)
+                    if len(vector) == state["dim"]:
+                        row = state["vectors"] + len(page_vectors)
+                        page_vectors.append(vector)
+                lines.append(json.dumps({"id": additional["id"], **record, "vector_row": row}, ensure_ascii=False))
+
+            jsonl.write(("\n".join(lines) + "\n").encode("utf-8"))
+            if page_vectors:
+                np.asarray(page_vectors, dtype="<f4").tofile(vectors)
+            jsonl.flush()
+            vectors.flush()
+            os.fsync(jsonl.fileno())
+            os.fsync(vectors.fileno())
+
+            state["cursor"] = cursor
+            state["records"] += len(records)
+            state["vectors"] += len(page_vectors)
+            state["jsonl_bytes"] = jsonl.tell()
+            _save_state(state_path, state)
+            print(f"📤 Exported {state['records']} {class_name} records ({state['vectors']} vectors)...")
+
+    state["complete"] = True
+    _save_state(state_path, state)
+    return state
+
+
+def iter_export(prefix):
+    """Yield (record, vector or None) from an export, reading vectors through a memory map."""
+    jsonl_path, vectors_path, state_path = export_paths(prefix)
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+
+    vectors = None
+    if state["vectors"]:
+        vectors = np.memmap(vectors_path, dtype="<f4", mode="r", shape=(state["vectors"], state["dim"]))
+
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            row = record.pop("vector_row")
+            yield record, (vectors[row] if row is not None else None)
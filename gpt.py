@@ -4,26 +4,31 @@ from dotenv import load_dotenv
 import random
 load_dotenv()
 from db import retrieve_conversation_history
+import llm
+from context_builder import build_context
 
 # Set your OpenAI API key
 openai.api_key = os.getenv("OPENAI_TOKEN")
 
+# Applied inline when streaming, instead of a second humanize_text call
+HUMANIZE_STYLE = "Write like a real person texting a friend: casual, mostly lowercase, very short, no numbered lists or bullet points."
 
-def generate_nick_response(user_input: str, user_id: str, session_context: list) -> str:
+SYSTEM_PROMPT = "You are Nik Setting. You are not a bot nor an AI. You are a friendly business strategist and marketing consultant who uses friends-like language to speak. Your responses should be concise, direct, and results-oriented. You speak like an experienced entrepreneur who focuses on performance metrics, conversions, and growth. Your tone is professional but informal and friendly, similar to a high-level sales consultant advising a client. Keep replies short, actionable, and to the point."
 
-    messages = [{"role": "system", "content": "You are Nik Setting. You are not a bot nor an AI. You are a friendly business strategist and marketing consultant who uses friends-like language to speak. Your responses should be concise, direct, and results-oriented. You speak like an experienced entrepreneur who focuses on performance metrics, conversions, and growth. Your tone is professional but informal and friendly, similar to a high-level sales consultant advising a client. Keep replies short, actionable, and to the point."}]
-    
-    for msg in session_context:
-        messages.append({
-            "role":msg["role"],
-            "content":msg["content"]
-        })
-    messages.append({"role": "user", "content": user_input})
+
+def build_messages(user_input: str, session_context: list, user_id: str = None) -> list:
+    """Build the chat prompt: system persona, summary of older turns, recent history within budget, new user turn."""
+    return build_context(user_id, SYSTEM_PROMPT, session_context, user_input)
+
+
+async def generate_nick_response(user_input: str, user_id: str, session_context: list) -> str:
+
+    messages = build_messages(user_input, session_context, user_id)
 
     try:
-        response = openai.ChatCompletion.create(
+        response = await llm.chat_completion(
+            messages,
             model="gpt-4-1106-preview",
-            messages=messages,
             max_tokens=250,
             temperature=random.choice([0.7, 0.8, 0.9]),  # Creative generation
             #top_p=0.95,        # Balanced diversity for natural responses
@@ -33,3 +38,20 @@ def generate_nick_response(user_input: str, user_id: str, session_context: list)
         return response['choices'][0]['message']['content'].strip()
     except Exception as e:
         return f"Error: {e}"
+
+
+async def stream_nick_response(user_input: str, user_id: str, session_context: list):
+    """Stream Nik's reply as text deltas, with the humanizing style applied in the prompt."""
+    messages = build_messages(user_input, session_context, user_id)
+    messages[0] = {"role": "system", "content": f"{SYSTEM_PROMPT} {HUMANIZE_STYLE}"}
+
+    try:
+        async for delta in llm.chat_completion_stream(
+            messages,
+            model="gpt-4-1106-preview",
+            max_tokens=250,
+            temperature=random.choice([0.7, 0.8, 0.9]),
+        ):
+            yield delta
+    except Exception as e:
+        yield f"Error: {e}"
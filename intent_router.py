@@ -0,0 +1,149 @@
+import os
+import asyncio
+import threading
+import numpy as np
+
+# Margin (positive-centroid minus negative-centroid cosine) below which the local decision is not trusted.
+# 0.03 is a hand-picked default, not calibrated on labelled traffic. Every intent sends results inside
+# the band to its GPT check (see util.py), so a band that is too narrow costs accuracy and one that
+# is too wide only costs GPT calls; widen it if local decisions look wrong in the logs.
+INTENT_UNCERTAIN_MARGIN = float(os.getenv("INTENT_UNCERTAIN_MARGIN", "0.03"))
+
+# Labeled examples per intent: (positives, negatives)
+INTENT_EXAMPLES = {
+    "travel": (
+        [
+            "Where are you traveling next month?",
+            "Any tips for my trip to Dubai?",
+            "I'm flying to London next week, what should I see?",
+            "Are you going on vacation this summer?",
+            "What's the best hotel area in Bali?",
+            "How was your flight back home?",
+            "Should I book my tickets to Tokyo now or wait?",
+            "Which country are you visiting after Spain?",
+            "Do I need a visa to travel to the US?",
+            "What are your travel plans for the holidays?",
+        ],
+        [
+            "How do I increase my conversion rate?",
+            "What's a good price for a B2B SaaS offer?",
+            "Can you review my cold email script?",
+            "How many leads should I expect from this ad spend?",
+            "What CRM do you recommend for a small agency?",
+            "How do I hire my first sales rep?",
+            "My Instagram engagement dropped, what should I change?",
+            "Have you signed the agreement & paid the invoice?",
+            "lol that's funny",
+            "thanks man, appreciate it",
+        ],
+    ),
+    "business": (
+        [
+            "How do I scale my agency past 10k a month?",
+            "What's the best way to generate B2B leads on LinkedIn?",
+            "How should I structure my sales call?",
+            "Which ads work best for e-commerce right now?",
+            "How do I grow my TikTok account for my brand?",
+            "What should my offer look like for local businesses?",
+            "How much should I charge for social media management?",
+            "How do I onboard VAs to handle outreach?",
+            "What metrics should I track for my funnel?",
+            "Can you give feedback on my landing page copy?",
+        ],
+        [
+            "lol",
+            "good morning everyone",
+            "what did you eat today?",
+            "did you watch the game last night?",
+            "I'm going to sleep, good night",
+            "haha that meme is great",
+            "how's the weather over there?",
+            "happy birthday bro!",
+            "where are you traveling next month?",
+            "my cat knocked over my coffee",
+        ],
+    ),
+    "worth_learning": (
+        [
+            "How do I price a retainer for a marketing agency?",
+            "What's the best follow-up sequence after a sales call?",
+            "How do I find decision makers at mid-size companies?",
+            "What's a good cost per lead for B2B Facebook ads?",
+            "How do I reduce churn for my SaaS?",
+            "What should I include in a client onboarding process?",
+            "How do I write a cold email that gets replies?",
+            "How do I build a content calendar for LinkedIn?",
+        ],
+        [
+            "ok",
+            "thanks",
+            "what do you think?",
+            "can you help me?",
+            "hmm not sure",
+            "business?",
+            "yes",
+            "tell me more",
+        ],
+    ),
+}
+
+_centroids = {}
+_centroid_lock = threading.Lock()
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def load_centroids():
+    """Embed the labeled examples (one batched request, cached on disk) and build per-intent centroids."""
+    with _centroid_lock:
+        if _centroids:
+            return _centroids
+
+        from db import generate_embeddings  # imported late: db connects to Weaviate on import
+
+        texts = [text for positives, negatives in INTENT_EXAMPLES.values() for text in positives + negatives]
+        embeddings = dict(zip(texts, generate_embeddings(texts)))
+
+        for intent, (positives, negatives) in INTENT_EXAMPLES.items():
+            pos = [embeddings[t] for t in positives if embeddings.get(t)]
+            neg = [embeddings[t] for t in negatives if embeddings.get(t)]
+            if pos and neg:
+                _centroids[intent] = (_normalize(np.mean(pos, axis=0)), _normalize(np.mean(neg, axis=0)))
+        return _centroids
+
+
+def score(intent, embedding):
+    """Cosine margin between the positive and negative centroids of an intent (None if unavailable)."""
+    centroids = _centroids.get(intent)
+    if centroids is None:
+        return None
+    query = _normalize(embedding)
+    positive, negative = centroids
+    return float(query @ positive - query @ negative)
+
+
+async def classify(intent, text, embedding=None):
+    """Decide an intent locally.
+
+    Returns True/False when the centroid margin is outside the uncertain band, or None
+    when the caller should fall back to the LLM.
+    """
+    try:
+        if not _centroids:
+            await asyncio.to_thread(load_centroids)
+        if embedding is None:
+            from db import agenerate_embedding
+            embedding = await agenerate_embedding(text)
+    except Exception as e:
+        print(f"⚠️ Local intent routing unavailable: {e}")
+        return None
+
+    margin = score(intent, embedding)
+    if margin is None or abs(margin) < INTENT_UNCERTAIN_MARGIN:
+        print(f"🤔 Local '{intent}' check uncertain (margin {margin}), falling back to GPT.")
+        return None
+    return margin > 0
@@ -0,0 +1,239 @@
+import os
+import json
+import sqlite3
+import asyncio
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class JobQueue:
+    """Durable FIFO of background jobs in SQLite; safe to open from several processes."""
+
+    def __init__(self, path="jobs.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+            "channel_id INTEGER, status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0, "
+            "progress_done INTEGER NOT NULL DEFAULT 0, progress_total INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, created_at TEXT NOT NULL, started_at TEXT, finished_at TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self._db.commit()
+
+    def _row(self, row):
+        columns = ("id", "kind", "payload", "channel_id", "status", "attempts", "progress_done",
+                   "progress_total", "error", "created_at", "started_at", "finished_at")
+        job = dict(zip(columns, row))
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def submit(self, kind, payload, channel_id=None):
+        """Queue a job; returns its id."""
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (kind, payload, channel_id, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload), channel_id, datetime.utcnow().isoformat()),
+            )
+            self._db.commit()
+            return cursor.lastrowid
+
+    def find_active(self, kind, payload):
+        """Id of a queued or running job with the same kind and payload, or None."""
+        row = self._db.execute(
+            "SELECT id FROM jobs WHERE kind = ? AND payload = ? AND status IN ('queued', 'running') ORDER BY id LIMIT 1",
+            (kind, json.dumps(payload)),
+        ).fetchone()
+        return row[0] if row else None
+
+    def claim(self):
+        """Mark the oldest queued job as running and return it, or None if the queue is empty."""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, progress_done = 0, progress_total = 0, "
+                "started_at = ? WHERE id = ?",
+                (datetime.utcnow().isoformat(), row[0]),
+            )
+            self._db.commit()
+            return self.get(row[0])
+
+    def get(self, job_id):
+        row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def set_progress(self, job_id, done, total):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET progress_done = ?, progress_total = ? WHERE id = ?", (done, total, job_id)
+            )
+            self._db.commit()
+
+    def finish(self, job_id, error=None, retry=False):
+        """Mark a job done, or failed with error; retry puts a failed job back in the queue."""
+        status = "done" if error is None else ("queued" if retry else "failed")
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, datetime.utcnow().isoformat(), job_id),
+            )
+            self._db.commit()
+        return status
+
+    def requeue_interrupted(self):
+        """Put jobs left 'running' by a previous process (crash, redeploy) back in the queue."""
+        with self._lock:
+            count = self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+            self._db.commit()
+        return count
+
+    def list(self, statuses=("queued", "running"), limit=50):
+        marks = ",".join("?" * len(statuses))
+        rows = self._db.execute(
+            f"SELECT * FROM jobs WHERE status IN ({marks}) ORDER BY id LIMIT ?", (*statuses, limit)
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def stats(self):
+        return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def _execute(db_path, job_id, handler, payload):
+    """Worker process entry point: run handler(**payload, progress=...) and report its result."""
+    queue = JobQueue(db_path)
+    return handler(**payload, progress=lambda done, total: queue.set_progress(job_id, done, total))
+
+
+class JobRunner:
+    """Feeds queued jobs to a pool of worker processes and reports progress through notify.
+
+    handlers maps a job kind to a top-level function taking the payload as keyword
+    arguments plus a progress(done, total) callback; a falsy result counts as a failure.
+    finalizers optionally maps a kind to a function run in this process (in a thread) with
+    the payload, for work that must update this process's state: it runs whenever the job
+    reports new progress, so results can be taken over piece by piece, and once more when
+    the job ends, even if it failed. It must be safe to repeat. Its final result decides a
+    successful job's outcome; a falsy result counts as a failure too. notify is an async
+    callable taking (job, text).
+    """
+
+    def __init__(self, queue, handlers, notify, workers=2, max_attempts=3, poll_interval=5.0, finalizers=None):
+        self.queue = queue
+        self.handlers = handlers
+        self.finalizers = finalizers or {}
+        self.notify = notify
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._pool = None
+        self._running = {}  # job id -> (job, future, last reported progress)
+        self._wakeup = None
+        self._task = None
+
+    def _new_pool(self):
+        # spawn: forking the bot process would copy its event loop and open connections
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def start(self):
+        """Requeue interrupted jobs and start dispatching on the running loop (once)."""
+        if self._task is None or self._task.done():
+            interrupted = self.queue.requeue_interrupted()
+            if interrupted:
+                print(f"🔁 Resuming {interrupted} background jobs interrupted by the last shutdown.")
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    def submit(self, kind, payload, channel_id=None):
+        job_id = self.queue.submit(kind, payload, channel_id)
+        if self._wakeup:
+            self._wakeup.set()
+        return job_id
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        self._pool = self._new_pool()
+        try:
+            while True:
+                self._wakeup.clear()
+                while len(self._running) < self.workers:
+                    job = self.queue.claim()
+                    if job is None:
+                        break
+                    future = loop.run_in_executor(
+                        self._pool, _execute, self.queue.path, job["id"], self.handlers[job["kind"]], job["payload"]
+                    )
+                    self._running[job["id"]] = [job, future, None]
+                    await self._notify(job, f"▶️ Started job #{job['id']} (attempt {job['attempts']}).")
+
+                await self._report()
+                futures = [entry[1] for entry in self._running.values()]
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                await asyncio.wait([*futures, waiter], timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+        finally:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _report(self):
+        """Post progress of running jobs and the outcome of finished ones."""
+        broken = False
+        for job_id, entry in list(self._running.items()):
+            job, future, reported = entry
+            if not future.done():
+                current = self.queue.get(job_id)
+                progress = (current["progress_done"], current["progress_total"])
+                if progress[1] and progress != reported:
+                    entry[2] = progress
+                    await self._notify(job, f"⏳ Job #{job_id}: {progress[0]}/{progress[1]} done.")
+                    if job["kind"] in self.finalizers:
+                        try:
+                            await asyncio.to_thread(self.finalizers[job["kind"]], **job["payload"])
+                        except Exception as e:
+                            print(f"⚠️ Couldn't finish part of job #{job_id} in the bot process: {e}")
+                continue
+
+            del self._running[job_id]
+            try:
+                error = None if future.result() else "finished incomplete"
+            except BrokenProcessPool as e:
+                error = f"worker process died ({e})"
+                broken = True
+            except Exception as e:
+                error = str(e) or type(e).__name__
+
+            if job["kind"] in self.finalizers:
+                # Also after a failure: whatever the worker finished is kept
+                try:
+                    finished = await asyncio.to_thread(self.finalizers[job["kind"]], **job["payload"])
+                except Exception as e:
+                    finished, error = False, error or str(e) or type(e).__name__
+                if error is None and not finished:
+                    error = "finishing in the bot process failed"
+
+            status = self.queue.finish(job_id, error, retry=error is not None and job["attempts"] < self.max_attempts)
+            if status == "done":
+                await self._notify(job, f"✅ Job #{job_id} finished.")
+            elif status == "queued":
+                await self._notify(job, f"⚠️ Job #{job_id} failed ({error}), retrying.")
+            else:
+                await self._notify(job, f"❌ Job #{job_id} failed after {job['attempts']} attempts: {error}")
+
+        if broken:
+            # A crashed worker takes the whole pool down with it
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+
+    async def _notify(self, job, text):
+        try:
+            await self.notify(job, text)
+        except Exception as e:
+            print(f"⚠️ Couldn't report on job #{job['id']}: {e}")
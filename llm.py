@@ -0,0 +1,89 @@
+import os
+import asyncio
+import aiohttp
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+openai.api_key = os.getenv("OPENAI_TOKEN")
+
+# Shared OpenAI client settings
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))  # seconds per call
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # in-flight OpenAI calls across all handlers
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))  # keep-alive connections
+CHAT_MODEL = "gpt-4-1106-preview"
+
+_session = None
+_semaphore = None
+
+
+async def get_session():
+    """Return the shared keep-alive aiohttp session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=LLM_POOL_SIZE, keepalive_timeout=60)
+        )
+    return _session
+
+
+def _get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def _call(create, timeout, **kwargs):
+    async with _get_semaphore():
+        openai.aiosession.set(await get_session())
+        return await asyncio.wait_for(create(request_timeout=timeout, **kwargs), timeout)
+
+
+async def chat_completion(messages, model=CHAT_MODEL, timeout=LLM_TIMEOUT, **kwargs):
+    """Non-blocking ChatCompletion call through the shared session."""
+    return await _call(openai.ChatCompletion.acreate, timeout, model=model, messages=messages, **kwargs)
+
+
+async def create_embedding(input, model, timeout=LLM_TIMEOUT):
+    """Non-blocking Embedding call through the shared session."""
+    return await _call(openai.Embedding.acreate, timeout, input=input, model=model)
+
+
+async def chat_completion_stream(messages, model=CHAT_MODEL, timeout=LLM_TIMEOUT, **kwargs):
+    """Stream a ChatCompletion, yielding content deltas as they arrive.
+
+    timeout bounds the wait for each chunk rather than the whole reply.
+    """
+    async with _get_semaphore():
+        openai.aiosession.set(await get_session())
+        stream = await asyncio.wait_for(
+            openai.ChatCompletion.acreate(
+                model=model, messages=messages, stream=True, request_timeout=timeout, **kwargs
+            ),
+            timeout,
+        )
+        while True:
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+            except StopAsyncIteration:
+                break
+            delta = chunk['choices'][0].get('delta', {}).get('content')
+            if delta:
+                yield delta
+
+
+def chat_completion_sync(messages, model=CHAT_MODEL, timeout=LLM_TIMEOUT, **kwargs):
+    """Blocking ChatCompletion call, for code that already runs in a worker thread."""
+    return openai.ChatCompletion.create(model=model, messages=messages, request_timeout=timeout, **kwargs)
+
+
+def create_embedding_sync(input, model, timeout=LLM_TIMEOUT):
+    """Blocking Embedding call, for code that already runs in a worker thread."""
+    return openai.Embedding.create(input=input, model=model, request_timeout=timeout)
+
+
+async def close():
+    """Close the shared HTTP session on shutdown."""
+    if _session is not None and not _session.closed:
+        await _session.close()
@@ -8,13 +8,23 @@ from typing import Final
 from dotenv import load_dotenv
 import discord
 from discord import Intents, Client, Message
-from responses import get_response
-from video_processing import learn_video_content
-from db import store_conversation_entry, find_most_similar_entry
+from responses import get_response, get_response_stream
+from video_processing import generate_video_qa, store_video_qa, canonical_video_url, is_video_learned, list_learned_videos, forget_video
+from job_queue import JobQueue, JobRunner
+from db import (
+    store_conversation_entry, find_most_similar_entry, find_most_similar_entries,
+    load_vector_index, save_vector_index, load_near_duplicate_index, is_near_duplicate, agenerate_embedding, generate_embeddings
+)
+from pipeline import StageRunner
+from session_store import SessionStore
+from outbound import SendScheduler
+from debounce import MessageCoalescer
+from backfill import backfill_channel
+import llm
 from util import (
     is_travel_related, is_greeting, greetings,
     is_business_or_social_media_related, is_worth_learning,
-    introduce_typos, detect_emotion, humanize_text
+    introduce_typos, adetect_emotion, warm_emotion_analyzer, humanize_text
 )
 
 # Load bot token
@@ -33,8 +43,41 @@ ADMIN_USERNAME = "meero0445"
 BUSINESS_CHANNEL_ID = 1333611536899379294
 
 # Session management
-session_store = {}
 SESSION_TIMEOUT = 300  # Session timeout in seconds (5 minutes)
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "40"))  # messages kept per session
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))  # live sessions before LRU eviction
+SESSION_MAX_MB = int(os.getenv("SESSION_MAX_MB", "50"))  # message bytes held across all sessions
+session_store = SessionStore(
+    timeout=SESSION_TIMEOUT,
+    max_sessions=SESSION_MAX_COUNT,
+    max_bytes=SESSION_MAX_MB * 1024 * 1024,
+    max_turns=SESSION_MAX_TURNS,
+)
+
+# Outbound messages go through one rate-limit-aware scheduler (per-channel and global token buckets)
+outbound = SendScheduler(channel_rate=(5, 5.0), global_rate=(50, 1.0))
+
+
+# Per-user debounce: fragments sent in quick succession become one turn; a lone message isn't delayed
+DEBOUNCE_WINDOW = float(os.getenv("DEBOUNCE_WINDOW", "1.5"))  # seconds of quiet before a burst's batch runs
+DEBOUNCE_MAX_WAIT = float(os.getenv("DEBOUNCE_MAX_WAIT", "4"))  # longest a first fragment waits
+DEBOUNCE_MAX_BATCH = int(os.getenv("DEBOUNCE_MAX_BATCH", "5"))  # fragments merged at most
+
+# Background jobs (video learning) survive restarts in a SQLite queue and run in worker processes
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3")
+VIDEO_JOB_WORKERS = int(os.getenv("VIDEO_JOB_WORKERS", "2"))  # videos learned at the same time
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Learning from business channels costs an embedding per message plus lookups and GPT checks (off by default)
+LEARN_BUSINESS_MESSAGES = os.getenv("LEARN_BUSINESS_MESSAGES", "0") == "1"
+
+# Reply delivery
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "0") == "1"  # post GPT replies as they stream, editing in place
+STREAM_MIN_CHARS = 40  # first post once this much text has arrived
+STREAM_EDIT_INTERVAL = 1.0  # seconds between edits (Discord allows ~5 edits / 5s per channel)
+TYPING_POLICY = os.getenv("TYPING_POLICY", "per_char")  # "none", "fixed" or "per_char"
+TYPING_DELAY = float(os.getenv("TYPING_DELAY", "10"))  # "fixed" delay, and the cap for "per_char"
+TYPING_CHARS_PER_SECOND = float(os.getenv("TYPING_CHARS_PER_SECOND", "25"))
 
 
 ##################### CHATBOT HELPER FUNCTIONS #####################
@@ -51,32 +94,51 @@ async def send_heartbeats():
             continue
 
 
-def get_session(user_id):
-    """Retrieve or create a session for a user."""
-    if user_id in session_store:
-        last_active, messages = session_store[user_id]
-        if time.time() - last_active < SESSION_TIMEOUT:
-            session_store[user_id] = (time.time(), messages)
-            return messages
-        else:
-            del session_store[user_id]  # Session expired
-
-    session_store[user_id] = (time.time(), [])
-    return session_store[user_id][1]
-
-
-def update_session(user_id, role, content):
-    """Add message to user session."""
-    if user_id in session_store:
-        last_active, messages = session_store[user_id]
-        messages.append({"role": role, "content": content})
-        session_store[user_id] = (time.time(), messages)
-
-
-def clear_session(user_id):
-    """Clear session context."""
-    if user_id in session_store:
-        del session_store[user_id]
+def typing_delay(text):
+    """How long to show the typing indicator before posting text, per TYPING_POLICY."""
+    if TYPING_POLICY == "fixed":
+        return TYPING_DELAY
+    if TYPING_POLICY == "per_char":
+        return min(len(text) / TYPING_CHARS_PER_SECOND, TYPING_DELAY)
+    return 0.0
+
+
+async def deliver_reply(target, content, audience=None):
+    """Send a complete reply after the typing-indicator delay; audience is the id of the user it answers."""
+    async with target.typing():
+        await asyncio.sleep(typing_delay(content))
+        return await outbound.send(target, content, audience=audience)
+
+
+async def stream_reply(target, prefix, chunks, audience=None):
+    """Post a reply as it streams: first message once STREAM_MIN_CHARS arrive, then rate-limited edits.
+
+    Returns the full reply text.
+    """
+    started = time.monotonic()
+    text, sent, last_edit = "", None, 0.0
+
+    async with target.typing():
+        async for delta in chunks:
+            text += delta
+            if sent is None:
+                if len(text.strip()) >= STREAM_MIN_CHARS:
+                    await asyncio.sleep(max(0.0, typing_delay(text) - (time.monotonic() - started)))
+                    sent = await outbound.send(target, prefix + text, coalesce=False)
+                    last_edit = time.monotonic()
+            elif time.monotonic() - last_edit >= STREAM_EDIT_INTERVAL:
+                outbound.edit(sent, prefix + text)  # not awaited; newer edits replace queued ones
+                last_edit = time.monotonic()
+
+    if not text.strip():
+        return text
+
+    final = prefix + introduce_typos(text)
+    if sent is None:
+        await deliver_reply(target, final, audience)
+    else:
+        await outbound.edit(sent, final)
+    return text
 
 
 ##################### CHATBOT WRAPPER FUNCTIONS #####################
@@ -87,86 +149,150 @@ async def send_message(message: Message, user_message: str, username: str) -> No
         print('(⚠️ Message was empty or intents are disabled.)')
         return
 
-    session_context = get_session(str(message.author.id))
+    user_id = str(message.author.id)
 
     is_private = user_message.startswith('?')
     if is_private:
         user_message = user_message[1:]  # Remove '?' for processing
 
     try:
-        if is_travel_related(user_message):
-            await message.author.send(f"🛪{message.author.name} asked you about your travel plans saying :{user_message}")
-            session_context.append({"role": "user", "content": user_message})
-            response = await get_response(user_message, str(message.author.id), session_context)
-            await message.channel.send(response)
-            return
-
+        # Greetings are decided locally, so answer them before starting any remote work
         if is_greeting(user_message):
-            await message.channel.send(random.choice(greetings))
+            message_coalescer.commit(user_id)
+            await outbound.send(message.channel, random.choice(greetings), audience=message.author.id)
             return
-        
-        emotion = detect_emotion(message.author.name, user_message)
-        if emotion:
-            print('EMOTION DETECTED')
-            await message.author.send(emotion)
-        else:
-            print("NO EMOTION DETECTED")
 
+        # The user turn is recorded once this batch commits; the prompt builder adds it until then
+        session_context = session_store.get(user_id)
+
+        # The travel check, emotion check and reply don't depend on each other, so start them together
+        async with StageRunner(f"send_message {username}") as stages:
+            emotion = stages.start("emotion", adetect_emotion(message.author.name, user_message))
+            # One embedding serves both the local intent router and the similarity lookup
+            query_embedding = await stages.start("embedding", agenerate_embedding(user_message))
+            travel = stages.start("travel", is_travel_related(user_message, query_embedding))
+            fetch_reply = get_response_stream if STREAM_REPLIES else get_response
+            reply = stages.start("response", fetch_reply(user_message, user_id, session_context, query_embedding))
+
+            # From here on the user sees side effects, so a newer fragment no longer cancels this turn
+            is_travel = await travel
+            message_coalescer.commit(user_id)
+            session_store.append(user_id, "user", user_message)
+
+            if is_travel:
+                stages.cancel("emotion")
+                await outbound.send(message.author, f"🛪{message.author.name} asked you about your travel plans saying :{user_message}")
+                if STREAM_REPLIES:
+                    await stream_reply(message.channel, "", await reply, message.author.id)
+                else:
+                    await outbound.send(message.channel, await reply, audience=message.author.id)
+                return
+
+            emotion = await emotion
+            if emotion:
+                print('EMOTION DETECTED')
+                await outbound.send(message.author, emotion)
+            else:
+                print("NO EMOTION DETECTED")
+
+            # Get response from AI
+            response = await reply
 
-        # Get response from AI
-        session_context.append({"role": "user", "content": user_message})
-        response = await get_response(user_message, str(message.author.id), session_context)
-        session_context.append({"role": "assistant", "content": response})
+        # Send response (Private or Public)
+        target = message.author if is_private else message.channel
+        prefix = "" if is_private else f"{message.author.mention} "
 
-        update_session(str(message.author.id), "assistant", response)
+        if STREAM_REPLIES:
+            # The humanizing style is part of the streaming prompt, so there's no second GPT call
+            response = await stream_reply(target, prefix, response, message.author.id)
+            session_store.append(user_id, "assistant", response)
+            return
+
+        session_store.append(user_id, "assistant", response)
         
-        humanized_response = humanize_text(response)
+        humanized_response = await humanize_text(response)
         response_with_typo = introduce_typos(humanized_response)
-        # Send response (Private or Public)
-        if is_private:
-            await asyncio.sleep(10)
-            await message.author.send(response_with_typo, mention_author=True)
-        else:
-            await asyncio.sleep(10)
-            await message.channel.send(f"{message.author.mention} {response_with_typo}", mention_author=True)
+        await deliver_reply(target, prefix + response_with_typo, message.author.id)
 
     except Exception as e:
         print(f"⚠️ Error in send_message: {e}")
 
 
+async def send_coalesced_messages(messages: list) -> None:
+    """Runs send_message once for a debounced batch of fragments from one user."""
+    last = messages[-1]
+    user_message = "\n".join(m.content.strip() for m in messages)
+    if len(messages) > 1:
+        print(f"🧩 Merged {len(messages)} messages from {last.author} into one turn.")
+    await send_message(last, user_message, str(last.author))
+
+
+message_coalescer = MessageCoalescer(
+    send_coalesced_messages,
+    window=DEBOUNCE_WINDOW,
+    max_wait=DEBOUNCE_MAX_WAIT,
+    max_batch=DEBOUNCE_MAX_BATCH,
+)
+
+
 ##################### DISCORD EVENT HANDLERS #####################
 
+async def backfill_business_messages(messages):
+    """Returns, per message, a new Q/A entry if it's business related and not yet known (else None)."""
+    contents = [m.content.strip() for m in messages]
+    # Obvious repeats of stored text are dropped before paying for an embedding
+    contents = ["" if is_near_duplicate(c) else c for c in contents]
+    embeddings = await asyncio.to_thread(generate_embeddings, contents)  # batched requests
+
+    is_business = await asyncio.gather(*(
+        is_business_or_social_media_related(c, e) if c and e else asyncio.sleep(0, False)
+        for c, e in zip(contents, embeddings)
+    ))
+    candidates = [i for i, business in enumerate(is_business) if business]
+
+    # One bulk similarity pass instead of a lookup per message
+    matches = await find_most_similar_entries([contents[i] for i in candidates], [embeddings[i] for i in candidates])
+
+    results = [None] * len(messages)
+    for i, (answer, _) in zip(candidates, matches):
+        if answer is None:
+            role = "assistant" if messages[i].author.name == ADMIN_USERNAME else "user"
+            results[i] = {"role": role, "content": contents[i]}
+    return results
+
+
+async def backfill_business_channel(channel):
+    """Scans business channel messages posted since the last checkpoint, in the background."""
+    # scan through history messages, store only once that is both business related and has no similarity in DB
+    try:
+        await backfill_channel(channel, process_batch=backfill_business_messages)
+    except Exception as e:
+        print(f"❌ Error scanning business channel history: {e}")
+
+
+backfill_task = None
+
+
 @client.event
 async def on_ready() -> None:
-    """Fetches past business/social media messages from Discord and stores them in Weaviate."""
+    """Starts the incremental scan of past business/social media messages in the background."""
+    global backfill_task
     print(f'🚀 {client.user} is now running & scanning past messages.')
 
+    # Picks up jobs interrupted by the last restart; a no-op if already running
+    job_runner.start()
+
+    # Load the emotion model now that we're connected; replies skip emotion detection until it's ready
+    warm_emotion_analyzer()
+
     channel = client.get_channel(BUSINESS_CHANNEL_ID)
     if not channel:
         print("❌ Error: Business channel not found.")
         return
 
-    stored_messages = set()
-    new_messages = []
-
-    # scan through history messages, store only once that is both business related and has no similarity in DB
-    async for message in channel.history(limit=5000):
-        content = message.content.strip()
-        if not content or not is_business_or_social_media_related(content):
-            continue
-
-        if await find_most_similar_entry(content) is None:
-            role = "assistant" if message.author.name == ADMIN_USERNAME else "user"
-            new_messages.append({"role": role, "content": content})
-            stored_messages.add(content)
-
-    # add the new business-related messages into the DB
-    # if new_messages:
-    #     for msg in new_messages:
-    #         store_conversation_entry(msg["role"], msg["content"], "imported_message")
-    #     print(f"✅ Stored {len(new_messages)} new business-related messages in Weaviate.")
-    # else:
-    #     print("✅ No new business messages to store.")
+    # on_ready fires again on every reconnect; don't start a second scan while one is running
+    if backfill_task is None or backfill_task.done():
+        backfill_task = asyncio.create_task(backfill_business_channel(channel))
 
 
 @client.event
@@ -184,7 +310,7 @@ async def on_message(message: Message) -> None:
 
     # General Channel - Respond with Context
     if channel_name == "general":
-        await send_message(message, user_message, username)
+        message_coalescer.submit(user_id, message)
         return
 
     # Business Channels - Store Q/A Conversations
@@ -194,37 +320,116 @@ async def on_message(message: Message) -> None:
     if username == ADMIN_USERNAME and user_message.lower().startswith("learn the content of this video:"):
         await handle_video_learning_request(message, user_message)
 
+    # Admin Requests for the Learned Video Cache
+    if username == ADMIN_USERNAME and user_message.lower() == "list learned videos":
+        await handle_list_videos_request(message)
+    if username == ADMIN_USERNAME and user_message.lower().startswith("forget this video:"):
+        await handle_forget_video_request(message, user_message)
+
 
 async def handle_business_conversations(username: str, user_message: str) -> None:
     """Stores business-related conversations in Weaviate."""
-    if not is_business_or_social_media_related(user_message):
+    if not LEARN_BUSINESS_MESSAGES:
         return
 
-    similar_message = await find_most_similar_entry(user_message)
+    embedding = await agenerate_embedding(user_message)
+    if not await is_business_or_social_media_related(user_message, embedding):
+        return
+
+    similar_message = await find_most_similar_entry(user_message, embedding)
 
-    if not similar_message and is_worth_learning(user_message):
-        #store_conversation_entry("user", user_message, "live_chat")
+    if not similar_message and await is_worth_learning(user_message, embedding):
+        await asyncio.to_thread(store_conversation_entry, "user", user_message, "live_chat")
         print("✅ Stored business-related user message.")
 
     if username == ADMIN_USERNAME:
-        #store_conversation_entry("assistant", user_message, "live_chat")
+        await asyncio.to_thread(store_conversation_entry, "assistant", user_message, "live_chat")
         print("✅ Stored admin response as assistant knowledge.")
 
 
+async def notify_job(job: dict, text: str) -> None:
+    """Posts background job progress to the channel the job was requested from."""
+    channel = client.get_channel(job["channel_id"]) if job["channel_id"] else None
+    if channel:
+        await outbound.send(channel, f"{text} {job['payload'].get('video_url', '')}".strip())
+
+
+job_runner = JobRunner(
+    JobQueue(JOB_QUEUE_PATH),
+    {"learn_video": generate_video_qa},  # GPT work runs in worker processes...
+    notify_job,
+    workers=VIDEO_JOB_WORKERS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    finalizers={"learn_video": store_video_qa},  # ...storage here, chunk by chunk, so the local indexes see it
+)
+
+
 async def handle_video_learning_request(message: Message, user_message: str) -> None:
-    """Handles admin requests to learn content from YouTube videos."""
-    video_url = user_message.split("learn the content of this video:")[-1].strip()
+    """Handles admin requests to learn content from YouTube videos (one or more links)."""
+    links = user_message.split("learn the content of this video:")[-1].replace(",", " ").split()
+    video_urls = [url for url in links if "youtube.com" in url or "youtu.be" in url]
+
+    if not video_urls:
+        await outbound.send(message.channel, "❌ Invalid YouTube link.")
+        return
 
-    if "youtube.com" in video_url or "youtu.be" in video_url:
-        await message.channel.send("📥 Learning from video, please wait...")
+    queued = []
+    for video_url in video_urls:
         try:
-            await asyncio.to_thread(learn_video_content, video_url)
-            await message.channel.send("✅ Video content learned and stored in Weaviate!")
-        except Exception as e:
-            print(f"❌ Error learning video content: {e}")
-            await message.channel.send("❌ Failed to learn video content.")
+            video_url = canonical_video_url(video_url)
+        except ValueError:
+            await outbound.send(message.channel, f"❌ Invalid YouTube link. {video_url}")
+            continue
+        if await asyncio.to_thread(is_video_learned, video_url):
+            await outbound.send(message.channel, f"✅ Already learned this video. {video_url}")
+            continue
+        # Two jobs for one video would pay for its Q&A twice and race on its checkpoint
+        active = job_runner.queue.find_active("learn_video", {"video_url": video_url})
+        if active:
+            await outbound.send(message.channel, f"⏳ Already learning this video as job #{active}. {video_url}")
+            continue
+        job_id = job_runner.submit("learn_video", {"video_url": video_url}, message.channel.id)
+        queued.append(f"#{job_id}")
+
+    if queued:
+        await outbound.send(message.channel, f"📥 Queued {len(queued)} video(s) for learning: {', '.join(queued)}. I'll post progress here.")
+
+
+async def handle_list_videos_request(message: Message) -> None:
+    """Lists the videos in the learned video cache."""
+    videos = await asyncio.to_thread(list_learned_videos)
+    if not videos:
+        await outbound.send(message.channel, "📭 No videos learned yet.")
+        return
+
+    lines = [
+        f"{'✅' if v['learned_at'] else '⏳'} {v['title']} (`{v['video_id']}`"
+        + (f", {v['chunks']} chunks, learned {v['learned_at'][:16]})" if v['learned_at']
+           else f", partially learned: {v['chunks']}/{v['chunks_total']} chunks)" if v['chunks'] else ", not finished)")
+        for v in videos
+    ]
+    # Keep each Discord message under the 2000 character limit
+    reply = ""
+    for line in lines:
+        if len(reply) + len(line) + 1 > 1900:
+            await outbound.send(message.channel, reply)
+            reply = ""
+        reply += line + "\n"
+    await outbound.send(message.channel, reply)
+
+
+async def handle_forget_video_request(message: Message, user_message: str) -> None:
+    """Drops a video from the learned video cache so it's learned again next time."""
+    video = user_message.split(":", 1)[-1].strip()
+    try:
+        forgotten = await asyncio.to_thread(forget_video, video)
+    except ValueError:
+        await outbound.send(message.channel, "❌ Invalid YouTube link.")
+        return
+    if forgotten:
+        await outbound.send(message.channel, "🗑️ Forgot that video; it'll be learned from scratch next time.")
     else:
-        await message.channel.send("❌ Invalid YouTube link.")
+        await outbound.send(message.channel, "❌ That video isn't in the cache.")
 
 
 
@@ -233,6 +438,10 @@ async def handle_video_learning_request(message: Message, user_message: str) ->
 async def run_bot():
     """Runs the Discord bot in an async event loop."""
     try:
+        await asyncio.to_thread(load_vector_index)  # no-op unless USE_LOCAL_INDEX=1
+        await asyncio.to_thread(load_near_duplicate_index)  # no-op unless NEAR_DUP_FILTER=1
+        session_store.start_sweeper()
+        outbound.start()
         await client.start(TOKEN)  # Use start() instead of run() for async compatibility
         print("bot is running...")
     except discord.errors.ConnectionClosed as e:
@@ -241,6 +450,9 @@ async def run_bot():
         await run_bot()
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
+    finally:
+        await asyncio.to_thread(save_vector_index)  # keeps what was learned this run for the next warm start
+        await llm.close()
 
 if __name__ == "__main__":
     asyncio.run(run_bot())    
@@ -0,0 +1,108 @@
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Dedicated inference thread that groups concurrent requests into batches.
+
+    A batch starts with the first queued request and takes whatever else arrives within
+    `max_wait_ms`, up to `max_batch` items, then runs `predict_batch(items)` once (it must
+    return one result per item). Under light load a request waits at most max_wait_ms;
+    under heavy load batches fill up and each forward pass serves many callers.
+    """
+
+    def __init__(self, predict_batch, max_batch=16, max_wait_ms=10.0, name="batcher", samples=1000, log_every=100):
+        self.predict_batch = predict_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.log_every = log_every  # print stats every N batches (0 = never)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=samples)
+        self._waits = deque(maxlen=samples)
+        self._latencies = deque(maxlen=samples)
+        self.items = 0
+        self.batches = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the worker thread (once)."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """Queue one item; returns a concurrent.futures.Future for its result."""
+        self.start()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    async def run(self, item):
+        """Await the result for one item without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                self._run_batch()
+            except Exception as e:  # never let one bad batch kill the worker; later callers would hang
+                print(f"❌ {self.name} worker error: {e}")
+
+    def _run_batch(self):
+        # Callers that gave up (e.g. a cancelled await) are dropped before inference
+        batch = [entry for entry in self._collect() if entry[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        try:
+            results = self.predict_batch([item for item, _, _ in batch])
+        except Exception as e:
+            self.failed += len(batch)
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        self._latencies.append(time.perf_counter() - start)
+        self._batch_sizes.append(len(batch))
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future, enqueued), result in zip(batch, results):
+            self._waits.append(start - enqueued)
+            future.set_result(result)
+        if self.log_every and self.batches % self.log_every == 0:
+            print(f"📊 {self.name} batching: {self.stats()}")
+
+    def stats(self):
+        waits = sorted(self._waits)
+        sizes = list(self._batch_sizes)
+        return {
+            "queued": self._queue.qsize(),
+            "items": self.items,
+            "batches": self.batches,
+            "failed": self.failed,
+            "avg_batch_size": sum(sizes) / len(sizes) if sizes else 0.0,
+            "max_batch_size": max(sizes, default=0),
+            "queue_wait_p50_ms": waits[len(waits) // 2] * 1000 if waits else 0.0,
+            "queue_wait_p95_ms": waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+            "batch_latency_avg_ms": sum(self._latencies) / len(self._latencies) * 1000 if self._latencies else 0.0,
+        }
@@ -0,0 +1,139 @@
+import re
+import zlib
+import threading
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 31) - 1  # keeps a * hash + b inside uint64
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def shingles(text, size=2):
+    """Normalized word `size`-grams of text (the whole text when it's shorter than that)."""
+    words = _TOKEN_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    """Exact Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def lsh_params(threshold, num_perm):
+    """Pick (bands, rows) so the LSH S-curve crosses 50% closest to threshold."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateIndex:
+    """MinHash signatures bucketed by LSH bands, for cheap near-duplicate text lookups.
+
+    A query only hashes its shingles and probes one bucket per band; candidates are
+    confirmed against the estimated Jaccard similarity of their signatures.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=2, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._keys = []
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def signature(self, text):
+        """MinHash signature of text, or None when it has no words."""
+        grams = shingles(text, self.shingle_size)
+        if not grams:
+            return None
+        hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+        hashes %= _MERSENNE_PRIME
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, key, text):
+        """Index text under key; returns False if it has nothing to hash."""
+        signature = self.signature(text)
+        if signature is None:
+            return False
+
+        with self._lock:
+            if self._count == len(self._signatures):
+                grown = np.empty((max(1024, 2 * self._count), self.num_perm), dtype=np.uint32)
+                grown[:self._count] = self._signatures[:self._count]
+                self._signatures = grown
+            row = self._count
+            self._signatures[row] = signature
+            self._keys.append(key)
+            self._count += 1
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+                bucket.setdefault(band_key, []).append(row)
+        return True
+
+    def add_many(self, keys, texts):
+        """Index several texts; returns how many were added."""
+        return sum(self.add(key, text) for key, text in zip(keys, texts))
+
+    def query(self, text, threshold=None):
+        """Return (key, estimated similarity) of the closest indexed text at or above threshold, else None."""
+        threshold = self.threshold if threshold is None else threshold
+        signature = self.signature(text)
+        if signature is None:
+            return None
+
+        with self._lock:
+            candidates = set()
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+                candidates.update(bucket.get(band_key, ()))
+            if not candidates:
+                return None
+
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarities = (self._signatures[rows] == signature).mean(axis=1)
+            best = int(similarities.argmax())
+            if similarities[best] < threshold:
+                return None
+            return self._keys[rows[best]], float(similarities[best])
+
+    def is_duplicate(self, text, threshold=None):
+        return self.query(text, threshold) is not None
+
+    def load_from_weaviate(self, client, class_name="ChatHistory", text_field="content", page_size=500):
+        """Page through a Weaviate class with a cursor and index one text field (no vectors needed)."""
+        total = 0
+        cursor = None
+        while True:
+            query = client.query.get(class_name, [text_field, "_additional { id }"]).with_limit(page_size)
+            if cursor:
+                query = query.with_after(cursor)
+            records = query.do().get("data", {}).get("Get", {}).get(class_name) or []
+            if not records:
+                break
+
+            total += self.add_many(
+                [r["_additional"]["id"] for r in records],
+                [r.get(text_field) or "" for r in records],
+            )
+            cursor = records[-1]["_additional"]["id"]
+        return total
@@ -0,0 +1,196 @@
+import time
+import asyncio
+from collections import deque
+
+DISCORD_MESSAGE_LIMIT = 2000
+
+
+class TokenBucket:
+    """Allows `rate` operations per `per` seconds, refilling continuously."""
+
+    def __init__(self, rate, per):
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.fill_rate = rate / per
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until one token is available (0 if available now)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.fill_rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+def _retrieve_exception(future):
+    # Callers may fire and forget (e.g. streaming edits); don't warn about unretrieved errors
+    if not future.cancelled():
+        future.exception()
+
+
+class _Job:
+    def __init__(self, kind, target, content, coalesce, audience=None):
+        self.kind = kind  # "send" or "edit"
+        self.target = target  # Messageable for sends, Message for edits
+        self.content = content
+        self.coalesce = coalesce
+        self.audience = audience  # who a send is meant for; only sends for the same audience are merged
+        self.futures = []
+        self.enqueued = time.monotonic()
+
+
+class SendScheduler:
+    """Outbound Discord queue: one FIFO per destination, drained fairly across destinations.
+
+    Every destination has its own token bucket and all of them share a global one, so a
+    noisy channel waits on its own bucket without holding up replies elsewhere. Pending
+    sends to the same destination and audience are merged into one message when they fit.
+    """
+
+    def __init__(self, channel_rate=(5, 5.0), global_rate=(50, 1.0), wait_samples=500):
+        self.channel_rate = channel_rate
+        self._global = TokenBucket(*global_rate)
+        self._buckets = {}
+        self._queues = {}
+        self._ready = deque()  # destinations with queued work, in round-robin order
+        self._busy = set()  # destinations with a request in flight (keeps per-destination order)
+        self._wakeup = None
+        self._runner = None
+        self._deliveries = set()  # in-flight delivery tasks (the loop only keeps weak references)
+        self._waits = deque(maxlen=wait_samples)
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def _bucket(self, key):
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(*self.channel_rate)
+        return self._buckets[key]
+
+    def _enqueue(self, key, job):
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_retrieve_exception)
+        queue = self._queues.setdefault(key, deque())
+
+        last = queue[-1] if queue else None
+        if last and last.coalesce and job.coalesce and last.kind == job.kind == "send" \
+                and last.audience == job.audience and len(last.content) + 1 + len(job.content) <= DISCORD_MESSAGE_LIMIT:
+            last.content += "\n" + job.content
+            last.futures.append(future)
+            self.coalesced += 1
+        elif last and last.kind == job.kind == "edit" and last.target is job.target:
+            last.content = job.content  # only the newest edit matters
+            last.futures.append(future)
+            self.coalesced += 1
+        else:
+            job.futures.append(future)
+            queue.append(job)
+            if key not in self._ready and key not in self._busy:
+                self._ready.append(key)
+
+        if self._wakeup:
+            self._wakeup.set()
+        return future
+
+    def send(self, target, content, coalesce=True, audience=None):
+        """Queue a message to a channel or user; resolves to the sent Message.
+
+        audience identifies who the message is for (e.g. the id of the user it replies to), so
+        replies to different users in one channel are never merged. Use coalesce=False when
+        the caller will edit the message afterwards.
+        """
+        self.start()
+        return self._enqueue(target.id, _Job("send", target, content, coalesce, audience))
+
+    def edit(self, message, content):
+        """Queue an edit of a message; superseded pending edits are dropped."""
+        self.start()
+        return self._enqueue(message.channel.id, _Job("edit", message, content, False))
+
+    def start(self):
+        """Start the dispatcher on the running loop (once)."""
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+        return self._runner
+
+    async def _deliver(self, key, job):
+        try:
+            if job.kind == "send":
+                result = await job.target.send(job.content)
+            else:
+                result = await job.target.edit(content=job.content)
+            self.sent += 1
+            for future in job.futures:
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            self.failed += 1
+            print(f"❌ Outbound {job.kind} failed: {e}")
+            for future in job.futures:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._busy.discard(key)
+            if self._queues.get(key):
+                self._ready.append(key)
+            else:
+                self._queues.pop(key, None)
+            self._wakeup.set()
+
+    def _next_ready(self):
+        """Pop the first destination (round robin) whose bucket has a token; else return the shortest wait."""
+        shortest = None
+        for _ in range(len(self._ready)):
+            key = self._ready.popleft()
+            wait = self._bucket(key).wait_time()
+            if wait == 0:
+                return key, 0.0
+            self._ready.append(key)
+            shortest = wait if shortest is None else min(shortest, wait)
+        return None, shortest
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            global_wait = self._global.wait_time()
+            if global_wait:
+                await asyncio.sleep(global_wait)
+                continue
+
+            key, wait = self._next_ready()
+            if key is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job = self._queues[key].popleft()
+            self._bucket(key).take()
+            self._global.take()
+            self._busy.add(key)
+            self._waits.append(time.monotonic() - job.enqueued)
+            task = asyncio.create_task(self._deliver(key, job))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    def stats(self):
+        waits = sorted(self._waits)
+        return {
+            "queued": sum(len(q) for q in self._queues.values()),
+            "destinations": len(self._queues),
+            "max_queue_depth": max((len(q) for q in self._queues.values()), default=0),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "wait_p50_s": waits[len(waits) // 2] if waits else 0.0,
+            "wait_max_s": waits[-1] if waits else 0.0,
+        }
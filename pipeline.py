@@ -0,0 +1,55 @@
+import time
+import asyncio
+
+
+class StageRunner:
+    """Runs independent per-message stages concurrently, times each one and cancels leftovers on exit."""
+
+    def __init__(self, label="message"):
+        self.label = label
+        self.tasks = {}
+        self.timings = {}
+        self._started = time.perf_counter()
+
+    def start(self, name, awaitable):
+        """Schedule a stage right away and return its task."""
+        async def timed():
+            started = time.perf_counter()
+            try:
+                return await awaitable
+            finally:
+                self.timings[name] = time.perf_counter() - started
+
+        task = asyncio.create_task(timed())
+        self.tasks[name] = task
+        return task
+
+    def cancel(self, *names):
+        """Cancel stages whose result is no longer needed."""
+        for name in names:
+            task = self.tasks.get(name)
+            if task and not task.done():
+                task.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pending = [task for task in self.tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        parts = []
+        for name, task in self.tasks.items():
+            if task.cancelled():
+                parts.append(f"{name}=cancelled")
+                continue
+            if task.exception():  # also marks the exception as retrieved
+                parts.append(f"{name}=failed")
+                continue
+            parts.append(f"{name}={self.timings.get(name, 0) * 1000:.0f}ms")
+
+        total = (time.perf_counter() - self._started) * 1000
+        print(f"⏱️ [{self.label}] {', '.join(parts)} | total {total:.0f}ms")
+        return False
@@ -1,11 +1,109 @@
+import os
+import time
+import asyncio
+from collections import deque
 from db import store_conversation_entry, find_most_similar_entry
-from gpt import generate_nick_response
+from gpt import generate_nick_response, build_messages, stream_nick_response
+from tokens import count_tokens, count_message_tokens
 
-async def get_response(user_message, user_id, session_context) -> str:
+# Speculative generation: start GPT alongside the similarity lookup ("off", "on", or "auto")
+SPECULATIVE_GENERATION = os.getenv("SPECULATIVE_GENERATION", "off")
+SPECULATION_HIT_RATE_THRESHOLD = float(os.getenv("SPECULATION_HIT_RATE_THRESHOLD", "0.3"))  # "auto" speculates below this
+SPECULATION_WINDOW = 50  # recent lookups used for the hit rate
+
+recent_lookups = deque(maxlen=SPECULATION_WINDOW)  # True = cache hit
+speculation_stats = {
+    "speculations": 0,
+    "wasted_generations": 0,
+    "wasted_tokens": 0,
+    "latency_saved_s": 0.0,
+}
+
+
+def cache_hit_rate():
+    """Share of recent lookups that returned a stored answer."""
+    return sum(recent_lookups) / len(recent_lookups) if recent_lookups else 0.0
+
+
+def should_speculate():
+    if SPECULATIVE_GENERATION == "on":
+        return True
+    if SPECULATIVE_GENERATION == "auto":
+        return cache_hit_rate() < SPECULATION_HIT_RATE_THRESHOLD
+    return False
+
+
+async def _timed_generation(user_message, user_id, session_context, timing):
+    started = time.perf_counter()
+    try:
+        return await generate_nick_response(user_message, user_id, session_context)
+    finally:
+        timing["generation"] = time.perf_counter() - started
+
+
+async def get_speculative_response(user_message, user_id, session_context, query_embedding=None) -> str:
+    """Race GPT generation against the similarity lookup; a stored answer cancels the generation."""
+    timing = {}
+    started = time.perf_counter()
+    generation = asyncio.create_task(_timed_generation(user_message, user_id, session_context, timing))
+
+    try:
+        similar_response = await find_most_similar_entry(user_message, query_embedding)
+    except Exception:
+        generation.cancel()
+        raise
+    lookup_time = time.perf_counter() - started
+    recent_lookups.append(bool(similar_response))
+    speculation_stats["speculations"] += 1
+
+    if similar_response:
+        print("🔍 Found a Similar Query (Using Stored Response, cancelling speculative generation)")
+        # Prompt tokens are spent either way; completion tokens only if the generation already finished
+        wasted = count_message_tokens(build_messages(user_message, session_context, user_id))
+        if generation.done() and not generation.cancelled() and not generation.exception():
+            wasted += count_tokens(generation.result())
+        generation.cancel()
+        speculation_stats["wasted_generations"] += 1
+        speculation_stats["wasted_tokens"] += wasted
+        return similar_response
+
+    print("🆕 No Similar Query Found (Using Speculative GPT Response)...")
+    response = await generation
+    speculation_stats["latency_saved_s"] += min(lookup_time, timing.get("generation", 0.0))
+    print(f"📊 Speculation: {speculation_stats}, hit rate {cache_hit_rate():.0%}")
+    return response
+
+
+async def _single_chunk(text):
+    yield text
+
+
+async def get_response_stream(user_message, user_id, session_context, query_embedding=None):
+    """Like get_response, but returns an async iterator of reply text chunks.
+
+    The similarity lookup is awaited here; a stored answer comes back as one chunk,
+    otherwise the GPT reply streams token by token.
+    """
+    similar_response = await find_most_similar_entry(user_message, query_embedding)
+    recent_lookups.append(bool(similar_response))
+
+    if similar_response:
+        print("🔍 Found a Similar Query (Using Stored Response)")
+        return _single_chunk(similar_response)
+
+    print("🆕 No Similar Query Found (Streaming GPT Response)...")
+    return stream_nick_response(user_message, user_id, session_context)
+
+
+async def get_response(user_message, user_id, session_context, query_embedding=None) -> str:
     """Fetch stored responses or generate a new one using GPT with context."""
 
+    if should_speculate():
+        return await get_speculative_response(user_message, user_id, session_context, query_embedding)
+
     # 1️⃣ Check Weaviate for a similar past query
-    similar_response = await find_most_similar_entry(user_message)
+    similar_response = await find_most_similar_entry(user_message, query_embedding)
+    recent_lookups.append(bool(similar_response))
 
     if similar_response:
         print("🔍 Found a Similar Query (Using Stored Response)")
@@ -13,7 +111,7 @@ async def get_response(user_message, user_id, session_context) -> str:
 
     # 2️⃣ If no match, generate response using GPT with context
     print("🆕 No Similar Query Found (Generating GPT Response)...")
-    response = generate_nick_response(user_message, user_id, session_context)
+    response = await generate_nick_response(user_message, user_id, session_context)
 
     # 3️⃣ Store new user query & assistant response in Weaviate
     # store_conversation_entry("user", user_message, "generated_user")
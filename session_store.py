@@ -0,0 +1,110 @@
+import time
+import asyncio
+import itertools
+from collections import OrderedDict
+
+
+def _message_bytes(message):
+    return len(message["content"].encode("utf-8"))
+
+
+class SessionStore:
+    """Per-user conversation sessions with TTL expiry, LRU eviction under global caps and a per-session turn cap."""
+
+    def __init__(self, timeout=300, max_sessions=10000, max_bytes=50 * 1024 * 1024, max_turns=40):
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.bytes_held = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._sessions = OrderedDict()  # user_id -> [last_active, messages, bytes, next_seq, generation]
+        self._generations = itertools.count(1)
+        self._sweeper = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _drop(self, user_id):
+        session = self._sessions.pop(user_id, None)
+        if session:
+            self.bytes_held -= session[2]
+
+    def _evict(self):
+        # Least recently active sessions go first; the most recent one is never evicted
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self.bytes_held > self.max_bytes):
+            user_id = next(iter(self._sessions))
+            self._drop(user_id)
+            self.evictions += 1
+
+    def _touch(self, user_id):
+        session = self._sessions.get(user_id)
+        if session and time.time() - session[0] >= self.timeout:
+            self._drop(user_id)  # Session expired
+            self.expirations += 1
+            session = None
+        if session is None:
+            session = [time.time(), [], 0, 0, next(self._generations)]
+            self._sessions[user_id] = session
+        session[0] = time.time()
+        self._sessions.move_to_end(user_id)
+        return session
+
+    def get(self, user_id):
+        """Retrieve or create a session for a user; returns its message list."""
+        session = self._touch(user_id)
+        self._evict()
+        return session[1]
+
+    def append(self, user_id, role, content):
+        """Add a message to the user's session, dropping the oldest turns beyond max_turns."""
+        session = self._touch(user_id)
+        # "session" identifies this incarnation of the session and "seq" the turn within it, so
+        # caches (e.g. context_builder's summaries) can key on stable values instead of object ids
+        message = {"role": role, "content": content, "session": session[4], "seq": session[3]}
+        session[3] += 1
+        session[1].append(message)
+        size = _message_bytes(message)
+
+        overflow = len(session[1]) - self.max_turns
+        if overflow > 0:
+            size -= sum(_message_bytes(m) for m in session[1][:overflow])
+            del session[1][:overflow]
+
+        session[2] += size
+        self.bytes_held += size
+        self._evict()
+
+    def clear(self, user_id):
+        """Clear session context."""
+        self._drop(user_id)
+
+    def sweep(self):
+        """Remove every expired session; returns how many were removed."""
+        now = time.time()
+        expired = [user_id for user_id, session in self._sessions.items() if now - session[0] >= self.timeout]
+        for user_id in expired:
+            self._drop(user_id)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self):
+        return {
+            "live_sessions": len(self._sessions),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bytes_held": self.bytes_held,
+        }
+
+    async def _sweep_forever(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            if self.sweep():
+                print(f"🧹 Session sweep: {self.stats()}")
+
+    def start_sweeper(self, interval=60):
+        """Start the background expiry sweeper on the running loop (once)."""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_forever(interval))
+        return self._sweeper
@@ -0,0 +1,137 @@
+import os
+import json
+import shutil
+import numpy as np
+
+# A binary snapshot is a directory of .npy columns, all opened with numpy.memmap on load:
+#   vectors.npy          (count, dim) normalized vectors, float32 or float16
+#   roles.npy            role of each row as a code into meta.json's role_names
+#   content_offsets.npy  count + 1 byte offsets into content_data.npy (UTF-8)
+#   content_data.npy
+#   id_offsets.npy       same layout for object ids ("" = no id)
+#   id_data.npy
+#   timestamps.npy       datetime64[s], NaT when unknown
+#   meta.json            format version, count, dim, dtype, role_names, synced_at (written last)
+# synced_at is when the index last held everything in Weaviate; newer objects are fetched on load.
+SNAPSHOT_VERSION = 1
+
+
+def is_snapshot(path):
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+class LazyColumn:
+    """Sequence over a mapped column that decodes rows on access; append() keeps new rows in memory."""
+
+    def __init__(self, size, decode, array=None):
+        self._size = size
+        self._decode = decode
+        self._tail = []
+        self.array = array  # the mapped column itself, for vectorized scans
+
+    def __len__(self):
+        return self._size + len(self._tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index >= self._size:
+            return self._tail[index - self._size]
+        return self._decode(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, value):
+        self._tail.append(value)
+
+
+def _text_column(values):
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def parse_timestamp(value):
+    if not value:
+        return np.datetime64("NaT", "s")
+    try:
+        return np.datetime64(value.rstrip("Z")[:19], "s")  # RFC 3339 as Weaviate returns it
+    except ValueError:
+        return np.datetime64("NaT", "s")
+
+
+def write_snapshot(path, vectors, roles, contents, ids, timestamps, dtype="float32", synced_at=None):
+    """Write a snapshot directory, replacing any existing one only once the new one is complete."""
+    count = len(vectors)
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, "vectors.npy"), np.asarray(vectors, dtype=dtype))
+
+    role_names = sorted({role or "" for role in roles})
+    codes = {name: i for i, name in enumerate(role_names)}
+    code_dtype = np.uint8 if len(role_names) <= 256 else np.uint32
+    np.save(os.path.join(tmp_path, "roles.npy"), np.asarray([codes[role or ""] for role in roles], dtype=code_dtype))
+
+    for name, values in (("content", contents), ("id", ids)):
+        offsets, data = _text_column(values)
+        np.save(os.path.join(tmp_path, f"{name}_offsets.npy"), offsets)
+        np.save(os.path.join(tmp_path, f"{name}_data.npy"), data)
+
+    np.save(os.path.join(tmp_path, "timestamps.npy"), np.asarray([parse_timestamp(t) for t in timestamps], dtype="datetime64[s]"))
+
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "count": count, "dim": int(np.shape(vectors)[1]) if count else None,
+                   "dtype": np.dtype(dtype).name, "role_names": role_names, "synced_at": synced_at}, f, indent=4)
+
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def read_snapshot(path):
+    """Map a snapshot directory. Returns a dict with the vectors memmap, a role array and lazy
+    content/id/timestamp columns; nothing but meta.json is read until rows are touched."""
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"❌ Snapshot {path} has format version {meta['version']}, expected {SNAPSHOT_VERSION}.")
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+    count = meta["count"]
+    role_names = np.asarray(meta["role_names"])
+    role_codes = load("roles")
+
+    def text(name, empty=""):
+        offsets, data = load(f"{name}_offsets"), load(f"{name}_data")
+        return LazyColumn(
+            count, lambda i: bytes(data[offsets[i]:offsets[i + 1]]).decode("utf-8") or empty
+        )
+
+    timestamps = load("timestamps")
+
+    def timestamp(i):
+        value = timestamps[i]
+        return None if np.isnat(value) else f"{value}Z"
+
+    return {
+        "meta": meta,
+        "vectors": load("vectors"),
+        "role_names": [name or None for name in meta["role_names"]],
+        "role_codes": role_codes,
+        "roles": LazyColumn(count, lambda i: str(role_names[role_codes[i]]) or None),
+        "contents": text("content"),
+        "ids": text("id", empty=None),
+        "timestamps": LazyColumn(count, timestamp, array=timestamps),
+    }
@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+import backfill
+
+
+class FakeChannel:
+    id = 1
+
+    def __init__(self, count):
+        created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.messages = [SimpleNamespace(id=i, created_at=created_at) for i in range(1, count + 1)]
+
+    async def history(self, limit=None, after=None, oldest_first=False):
+        messages = [m for m in self.messages if after is None or m.id > after.id]
+        if not oldest_first:
+            messages = messages[::-1][:limit]
+        for message in messages:
+            yield message
+
+    def __str__(self):
+        return "test"
+
+
+def test_checkpoint_stops_before_first_failed_message(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    channel = FakeChannel(6)
+    seen = []
+
+    async def flaky(message):
+        if message.id == 3:
+            raise RuntimeError("boom")
+        seen.append(message.id)
+        return message.id
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(backfill.backfill_channel(channel, process=flaky, concurrency=4))
+    assert backfill.load_state()["1"]["last_message_id"] == 2
+
+    async def process(message):
+        seen.append(message.id)
+        return message.id
+
+    seen.clear()
+    assert asyncio.run(backfill.backfill_channel(channel, process=process, concurrency=4)) == [3, 4, 5, 6]
+    assert seen == [3, 4, 5, 6]
+    assert backfill.load_state()["1"]["last_message_id"] == 6
@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from session_store import SessionStore
+
+
+def test_session_messages_carry_generation_and_seq():
+    store = SessionStore(max_turns=3)
+    for i in range(5):
+        store.append("u", "user", f"m{i}")
+    history = store.get("u")
+    assert [m["seq"] for m in history] == [2, 3, 4]
+    generation = history[0]["session"]
+
+    store.clear("u")
+    store.append("u", "user", "again")
+    assert store.get("u")[0]["session"] != generation
+    assert store.get("u")[0]["seq"] == 0
+
+
+def test_summary_cache_uses_session_generation_and_seq(monkeypatch):
+    pytest.importorskip("openai")
+    import context_builder
+
+    prompts = []
+
+    async def fake_completion(messages, max_tokens=None):
+        prompts.append(messages[0]["content"])
+        return {"choices": [{"message": {"content": f"summary {len(prompts)}"}}]}
+
+    monkeypatch.setattr(context_builder.llm, "chat_completion", fake_completion)
+    monkeypatch.setattr(context_builder, "_summaries", context_builder.OrderedDict())
+    store = SessionStore(max_turns=4)
+
+    async def build():
+        messages = context_builder.build_context("u", "system", store.get("u"), "next", budget=40)
+        await asyncio.gather(*context_builder._pending.values())
+        return messages
+
+    async def scenario():
+        for i in range(4):
+            store.append("u", "user", f"turn {i} " + "word " * 20)
+        await build()
+        assert context_builder._summaries["u"]["last"] == 2
+
+        # Older turns trimmed away must not be summarized twice
+        store.append("u", "user", "turn 4 " + "word " * 20)
+        messages = await build()
+        assert messages[1]["content"].endswith("summary 1")
+        assert "turn 3" in prompts[1] and "turn 1" not in prompts[1]
+
+        # A recreated session drops the old summary
+        store.clear("u")
+        for i in range(2):
+            store.append("u", "user", f"fresh {i} " + "word " * 20)
+        messages = await build()
+        assert all("summary" not in m["content"] for m in messages)
+
+    asyncio.run(scenario())
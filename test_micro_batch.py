@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from micro_batch import MicroBatcher
+
+
+def test_cancelled_caller_does_not_kill_worker():
+    release = threading.Event()
+
+    def predict(items):
+        release.wait(5)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(predict, max_batch=4, max_wait_ms=1, log_every=0)
+
+    async def scenario():
+        blocker = asyncio.ensure_future(batcher.run(1))  # occupies the worker
+        await asyncio.sleep(0.05)
+        cancelled = asyncio.ensure_future(batcher.run(2))  # queued behind it, then cancelled
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        release.set()
+        assert await blocker == 2
+        assert await asyncio.wait_for(batcher.run(3), timeout=2) == 6
+        return cancelled
+
+    cancelled = asyncio.run(scenario())
+    assert cancelled.cancelled()
+    assert batcher._thread.is_alive()
+
+
+def test_cancelled_while_predicting_does_not_kill_worker():
+    started = threading.Event()
+    release = threading.Event()
+
+    def predict(items):
+        started.set()
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(predict, max_batch=4, max_wait_ms=1, log_every=0)
+
+    async def scenario():
+        task = asyncio.ensure_future(batcher.run("a"))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        release.set()
+        await asyncio.sleep(0.05)
+        return await asyncio.wait_for(batcher.run("b"), timeout=2)
+
+    assert asyncio.run(scenario()) == "b"
+    assert batcher._thread.is_alive()
+
+
+def test_failed_batch_reports_error_and_worker_survives():
+    calls = []
+
+    def predict(items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return items
+
+    batcher = MicroBatcher(predict, max_batch=1, max_wait_ms=1, log_every=0)
+    first = batcher.submit("x")
+    try:
+        first.result(timeout=2)
+        assert False, "expected the batch error"
+    except RuntimeError:
+        pass
+    assert batcher.submit("y").result(timeout=2) == "y"
+    assert batcher.failed == 1
@@ -0,0 +1,32 @@
+import asyncio
+import util
+
+
+def _patch(monkeypatch, decision, answer="yes"):
+    calls = []
+
+    async def classify(intent, text, embedding=None):
+        return decision
+
+    async def chat_completion(messages, **kwargs):
+        calls.append(messages)
+        return {"choices": [{"message": {"content": answer}}]}
+
+    monkeypatch.setattr(util.intent_router, "classify", classify)
+    monkeypatch.setattr(util.llm, "chat_completion", chat_completion)
+    return calls
+
+
+def test_uncertain_business_check_falls_back_to_gpt(monkeypatch):
+    calls = _patch(monkeypatch, decision=None)
+    assert asyncio.run(util.is_business_or_social_media_related("How do I price my agency retainer?"))
+    assert len(calls) == 1
+
+    calls = _patch(monkeypatch, decision=None, answer="no")
+    assert not asyncio.run(util.is_business_or_social_media_related("my cat knocked over my coffee"))
+
+
+def test_confident_business_check_skips_gpt(monkeypatch):
+    calls = _patch(monkeypatch, decision=False)
+    assert not asyncio.run(util.is_business_or_social_media_related("good morning everyone"))
+    assert calls == []
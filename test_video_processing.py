@@ -0,0 +1,61 @@
+import sys
+import types
+import importlib
+import pytest
+
+VIDEO_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+@pytest.fixture
+def video_processing(tmp_path, monkeypatch):
+    # db connects to Weaviate on import; record what would be stored instead
+    stored = []
+    fake_db = types.ModuleType("db")
+    fake_db.store_qa_in_weaviate = lambda qa_conversation, source=None: stored.append(qa_conversation) or True
+    monkeypatch.setitem(sys.modules, "db", fake_db)
+    monkeypatch.delitem(sys.modules, "video_processing", raising=False)
+    monkeypatch.setenv("VIDEO_CACHE_PATH", str(tmp_path / "video_cache.sqlite3"))
+    monkeypatch.setenv("VIDEO_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.chdir(tmp_path)
+
+    module = importlib.import_module("video_processing")
+    monkeypatch.setattr(module, "QA_CHUNK_SIZE", 2)
+    module.video_cache.put_transcript("dQw4w9WgXcQ", "Test video", "a b c d e f")
+    module.stored = stored
+    return module
+
+
+def _fake_generation(failing):
+    def generate(number, total, chunk):
+        metrics = {"chunk": number, "latency_s": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "attempts": 1}
+        if number in failing:
+            return None, metrics
+        return [{"role": "user", "content": chunk}, {"role": "assistant", "content": "ok"}], metrics
+    return generate
+
+
+def test_failed_chunk_does_not_hold_back_the_others(video_processing, monkeypatch):
+    monkeypatch.setattr(video_processing, "_generate_qa_with_retries", _fake_generation(failing={2}))
+
+    assert not video_processing.learn_video_content(VIDEO_URL)
+    assert sorted(qa[0]["content"] for qa in video_processing.stored) == ["a b", "e f"]
+    assert not video_processing.is_video_learned(VIDEO_URL)
+    video = video_processing.list_learned_videos()[0]
+    assert (video["learned_at"], video["chunks"], video["chunks_total"]) == (None, 2, 3)
+
+    # A later run generates and stores only the missing chunk
+    monkeypatch.setattr(video_processing, "_generate_qa_with_retries", _fake_generation(failing=set()))
+    assert video_processing.learn_video_content(VIDEO_URL)
+    assert [qa[0]["content"] for qa in video_processing.stored[2:]] == ["c d"]
+    assert video_processing.is_video_learned(VIDEO_URL)
+
+
+def test_store_video_qa_stores_ready_chunks_while_generation_runs(video_processing):
+    transcript = video_processing.video_cache.get_transcript("dQw4w9WgXcQ")["text"]
+    checkpoint = video_processing.load_video_checkpoint("dQw4w9WgXcQ", transcript, 2)
+    checkpoint["chunks"]["1"] = [{"role": "user", "content": "c d"}, {"role": "assistant", "content": "ok"}]
+    video_processing.save_video_checkpoint(checkpoint)
+
+    assert not video_processing.store_video_qa(VIDEO_URL)
+    assert not video_processing.store_video_qa(VIDEO_URL)  # nothing new to store
+    assert [qa[0]["content"] for qa in video_processing.stored] == ["c d"]
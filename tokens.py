@@ -0,0 +1,36 @@
+import math
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character estimate if tiktoken isn't installed
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4  # Rough average for English text on OpenAI tokenizers
+
+
+@lru_cache(maxsize=None)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The BPE file is downloaded on first use; estimate instead of failing when offline
+        print(f"⚠️ Could not load tiktoken encoding, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text):
+    """Count tokens in text locally (exact with tiktoken, estimated otherwise)."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages):
+    """Count tokens for a list of chat messages, including the per-message framing overhead."""
+    return sum(4 + count_tokens(m["content"]) for m in messages) + 2
@@ -1,15 +1,29 @@
 import os
 import random
 import openai
-from openai.embeddings_utils import get_embedding, cosine_similarity
 import numpy as np
 import json
 import time
 import asyncio
-from transformers import pipeline
-from pysentimiento import create_analyzer
-
-emotion_analyzer = create_analyzer(task="emotion", lang="en")
+import threading
+import llm
+import intent_router
+from micro_batch import MicroBatcher
+
+# The emotion model (pysentimiento/transformers/torch) takes seconds and hundreds of MB to load,
+# so it's loaded on first use or warmed in the background once the bot is connected
+emotion_analyzer = None
+_emotion_lock = threading.Lock()
+_emotion_warmup = None
+_emotion_error = None
+
+# "torch" (default, pysentimiento's analyzer), "torch-batched", "int8" (dynamically quantized torch),
+# "onnx" or "onnx-int8" (ONNX Runtime), see emotion_backends
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "torch")
+
+# Concurrent emotion checks share one batched forward pass on a dedicated thread
+EMOTION_MAX_BATCH = int(os.getenv("EMOTION_MAX_BATCH", "16"))
+EMOTION_MAX_WAIT_MS = float(os.getenv("EMOTION_MAX_WAIT_MS", "10"))
 
 greetings = [
     "hi", "hey", "hello", "yo", "sup", "what's up", "howdy", "hiya",
@@ -44,13 +58,48 @@ def is_greeting(message: str) -> bool:
     return message.lower() in greetings
 
 def generate_embedding(query, engine):
+    from openai.embeddings_utils import get_embedding  # pulls in pandas/scipy/sklearn, keep it off the import path
     return get_embedding(query, engine)
 
 def find_cos_similarity(current_embedding, stored_embedding):
+    from openai.embeddings_utils import cosine_similarity
     return cosine_similarity(current_embedding, stored_embedding)
 
-def detect_emotion(user, msg):
-    result = emotion_analyzer.predict(str(msg))
+def get_emotion_analyzer():
+    """Return the emotion model, loading it on first call (None if it failed to load)."""
+    global emotion_analyzer, _emotion_error
+    with _emotion_lock:
+        if emotion_analyzer is None and _emotion_error is None:
+            start = time.time()
+            try:
+                from emotion_backends import load_backend
+                try:
+                    emotion_analyzer = load_backend(EMOTION_BACKEND)
+                except Exception as e:
+                    if EMOTION_BACKEND == "torch":
+                        raise
+                    print(f"⚠️ Emotion backend {EMOTION_BACKEND} failed to load ({e}), falling back to torch.")
+                    emotion_analyzer = load_backend("torch")
+                print(f"✅ Emotion model ({emotion_analyzer.name}) loaded in {time.time() - start:.1f}s.")
+            except Exception as e:
+                _emotion_error = e
+                print(f"⚠️ Emotion model unavailable, emotion detection disabled: {e}")
+        return emotion_analyzer
+
+def warm_emotion_analyzer():
+    """Load the emotion model in a background thread (once)."""
+    global _emotion_warmup
+    if _emotion_warmup is None:
+        _emotion_warmup = threading.Thread(target=get_emotion_analyzer, name="emotion-warmup", daemon=True)
+        _emotion_warmup.start()
+    return _emotion_warmup
+
+def _predict_emotions(texts):
+    return emotion_analyzer.predict(texts)
+
+emotion_batcher = MicroBatcher(_predict_emotions, EMOTION_MAX_BATCH, EMOTION_MAX_WAIT_MS, name="emotion")
+
+def _describe_emotion(user, msg, result):
     emotion = None
     for label in result.probas:
         if label in ["joy", "anger", "sadness", "fear"] and result.probas[label] > 0.85:
@@ -58,6 +107,26 @@ def detect_emotion(user, msg):
 
     return emotion
 
+def detect_emotion(user, msg):
+    """Describe a strong emotion in msg, or None. Skips (returns None) while the model is still warming up."""
+    if emotion_analyzer is None:
+        warm_emotion_analyzer()
+        return None
+
+    return _describe_emotion(user, msg, emotion_batcher.submit(str(msg)).result())
+
+async def adetect_emotion(user, msg):
+    """detect_emotion for the event loop: waits on the batching worker instead of a thread."""
+    if emotion_analyzer is None:
+        warm_emotion_analyzer()
+        return None
+
+    try:
+        return _describe_emotion(user, msg, await emotion_batcher.run(str(msg)))
+    except Exception as e:
+        print(f"⚠️ Error detecting emotion: {e}")
+        return None
+
 async def send_heartbeats():
     """Send manual heartbeats to Discord to prevent disconnections."""
     while True:
@@ -69,23 +138,44 @@ async def send_heartbeats():
             print(f"❌ Failed to send heartbeat: {e}")
             break
 
-def is_business_or_social_media_related(message: str) -> bool:
-    """Check if a message is related to business or social media using pysentimiento."""
-    return False
+async def is_business_or_social_media_related(message: str, embedding=None) -> bool:
+    """Check if a message is related to business or social media; the local intent router first, GPT when it's unsure."""
+    if len(message) < 3:
+        return False
+
+    decision = await intent_router.classify("business", message, embedding)
+    if decision is not None:
+        return decision
 
-def is_travel_related(message: str) -> bool:
+    try:
+        response = await llm.chat_completion(
+            [{"role": "system", "content": "Your job is to identify if a given message is about business or social media, such as sales, marketing, clients, offers, ads or growing an audience. If it is, say 'yes'. If it is unrelated, say 'no'."},
+             {"role": "user", "content": f"Is this message about business or social media? {message}"}],
+            model="gpt-4-1106-preview",
+            max_tokens=10
+        )
+        return "yes" in response['choices'][0]['message']['content'].strip().lower()
+    except Exception as e:
+        print(f"Error in business detection: {e}")
+        return False
+
+async def is_travel_related(message: str, embedding=None) -> bool:
 
     if len(message) < 3:
         return False
 
+    decision = await intent_router.classify("travel", message, embedding)
+    if decision is not None:
+        return decision
+
     try:
         temp_conversation = [
             {"role": "system", "content": "You are a travel expert. Your job is to identify if a given question is related to travel, such as trips, locations, or travel plans. If it is unrelated, say 'no'. If it is travel-related, say 'yes'."},
             {"role": "user", "content": f"Is this message about traveling? {message}"}
         ]
-        response = openai.ChatCompletion.create(
+        response = await llm.chat_completion(
+            temp_conversation,
             model="gpt-4-1106-preview",
-            messages=temp_conversation,
             max_tokens=50
         )
         return "yes" in response['choices'][0]['message']['content'].strip().lower()
@@ -94,8 +184,12 @@ def is_travel_related(message: str) -> bool:
         return False
 
 
-def is_worth_learning(message: str) -> bool:
+async def is_worth_learning(message: str, embedding=None) -> bool:
     """Uses GPT to determine if a business-related message is valuable for learning."""
+
+    decision = await intent_router.classify("worth_learning", message, embedding)
+    if decision is not None:
+        return decision
     
     try:
         prompt = f"""
@@ -107,10 +201,10 @@ def is_worth_learning(message: str) -> bool:
         If it's too vague, unhelpful, or meaningless, say "no".
         """
 
-        response = openai.ChatCompletion.create(
+        response = await llm.chat_completion(
+            [{"role": "system", "content": "You are a business assistant that evaluates if a question is worth storing."},
+             {"role": "user", "content": prompt}],
             model="gpt-4-1106-preview",
-            messages=[{"role": "system", "content": "You are a business assistant that evaluates if a question is worth storing."},
-                      {"role": "user", "content": prompt}],
             max_tokens=10
         )
 
@@ -168,15 +262,15 @@ def introduce_typos(text, typo_percentage=0.02):
     
     return ' '.join(words)
 
-def humanize_text(text):
+async def humanize_text(text):
     prompt = f"""
         {text}
     humanize this and make it sound normal-like and very short, no need to use numerical or bullet points
     """
     try:
-        response = openai.ChatCompletion.create(
+        response = await llm.chat_completion(
+                [{"role": "user", "content": prompt}],
                 model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
                 max_tokens=400
             )
 
@@ -0,0 +1,359 @@
+import json
+import threading
+from datetime import datetime
+import numpy as np
+from snapshot import parse_timestamp, read_snapshot, write_snapshot
+
+
+def _utcnow():
+    return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def certainty_to_cosine(certainty):
+    """Convert a Weaviate certainty threshold into the equivalent cosine similarity."""
+    return 2 * certainty - 1
+
+
+class VectorIndex:
+    """In-process cosine index: a contiguous float32 matrix plus parallel role/id/content/timestamp arrays."""
+
+    def __init__(self, dim=None, capacity=1024):
+        self.dim = dim
+        self._capacity = capacity
+        self._vectors = None
+        self._role_codes = None  # per entry, an index into _role_names; grows with _vectors
+        self._role_names = []
+        self._role_lookup = {}
+        self._ids = []
+        self._contents = []
+        self._timestamps = []
+        self._size = 0
+        self.synced_at = None  # when the index last held everything in Weaviate (see catch_up_from_weaviate)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def vectors(self):
+        """Normalized vectors currently held (a view, no copy)."""
+        if self._vectors is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return self._vectors[:self._size]
+
+    @property
+    def roles(self):
+        """Role of every entry as a numpy array."""
+        if self._role_codes is None:
+            return np.asarray([], dtype=object)
+        return np.asarray(self._role_names, dtype=object)[self._role_codes[:self._size]]
+
+    def _role_code(self, role):
+        code = self._role_lookup.get(role)
+        if code is None:
+            code = self._role_lookup[role] = len(self._role_names)
+            self._role_names.append(role)
+        return code
+
+    def _role_mask(self, role):
+        """Boolean mask of the entries with this role, compared as integer codes."""
+        code = self._role_lookup.get(role)
+        if code is None:
+            return np.zeros(self._size, dtype=bool)
+        return self._role_codes[:self._size] == code
+
+    def _ensure_capacity(self, extra):
+        needed = self._size + extra
+        if self._vectors is not None and needed <= self._vectors.shape[0]:
+            return
+        capacity = max(self._capacity, needed)
+        if self._vectors is not None:
+            capacity = max(capacity, self._vectors.shape[0] * 2)
+        grown = np.empty((capacity, self.dim), dtype=np.float32)
+        grown_codes = np.empty(capacity, dtype=np.int32)
+        if self._vectors is not None:
+            grown[:self._size] = self._vectors[:self._size]
+            grown_codes[:self._size] = self._role_codes[:self._size]
+        self._vectors = grown
+        self._role_codes = grown_codes
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def add_many(self, roles, contents, embeddings, ids=None, timestamps=None):
+        """Append several entries at once; entries without an embedding are skipped."""
+        rows = [
+            (r, c, e, i, t)
+            for r, c, e, i, t in zip(roles, contents, embeddings, ids or [None] * len(roles), timestamps or [None] * len(roles))
+            if e is not None and len(e)
+        ]
+        if not rows:
+            return 0
+
+        matrix = np.asarray([row[2] for row in rows], dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"❌ Embedding has {matrix.shape[1]} dims, index expects {self.dim}.")
+
+            self._ensure_capacity(len(rows))
+            self._vectors[self._size:self._size + len(rows)] = self._normalize(matrix)
+            self._role_codes[self._size:self._size + len(rows)] = [self._role_code(row[0]) for row in rows]
+            for _, content, _, object_id, timestamp in rows:
+                self._contents.append(content)
+                self._ids.append(object_id)
+                self._timestamps.append(timestamp)
+            self._size += len(rows)
+        return len(rows)
+
+    def add(self, role, content, embedding, object_id=None, timestamp=None):
+        """Append a single entry."""
+        return self.add_many([role], [content], [embedding], [object_id], [timestamp])
+
+    def search_roles(self, query_embedding, thresholds):
+        """Score the query against every row in one matrix-vector product and return the
+        best (content, id, certainty) per role in ``thresholds`` ({role: certainty}), or None."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        matches = {role: None for role in thresholds}
+        if norm == 0:
+            return matches
+
+        with self._lock:
+            if self._size == 0:
+                return matches
+            scores = self._vectors[:self._size] @ (query / norm)
+            for role, certainty in thresholds.items():
+                masked = scores if role is None else np.where(self._role_mask(role), scores, -np.inf)
+                best = int(np.argmax(masked))
+                score = float(masked[best])
+                if score >= certainty_to_cosine(certainty):
+                    matches[role] = (self._contents[best], self._ids[best], (1 + score) / 2)
+        return matches
+
+    def search_many(self, query_embeddings, thresholds, chunk_size=256):
+        """Batch search_roles: scores N queries against all M rows as (N×D)·(D×M) products.
+
+        Returns one {role: (content, id, certainty) or None} dict per query.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        results = [{role: None for role in thresholds} for _ in range(len(queries))]
+        if not len(queries):
+            return results
+        queries = self._normalize(queries)
+
+        with self._lock:
+            if self._size == 0:
+                return results
+            vectors = self._vectors[:self._size]
+            masks = {role: self._role_mask(role) for role in thresholds if role is not None}
+
+            for start in range(0, len(queries), chunk_size):  # bounds the N×M score matrix
+                scores = queries[start:start + chunk_size] @ vectors.T
+                for role, certainty in thresholds.items():
+                    masked = scores if role is None else np.where(masks[role], scores, -np.inf)
+                    best = np.argmax(masked, axis=1)
+                    best_scores = masked[np.arange(len(best)), best]
+                    passed = best_scores >= certainty_to_cosine(certainty)
+                    for offset in np.flatnonzero(passed):
+                        row = int(best[offset])
+                        results[start + offset][role] = (
+                            self._contents[row], self._ids[row], (1 + float(best_scores[offset])) / 2
+                        )
+        return results
+
+    def search(self, query_embedding, role=None, certainty=0.0):
+        """Return (content, id, certainty) of the best entry with the given role above the threshold, or None."""
+        return self.search_roles(query_embedding, {role: certainty})[role]
+
+    def load_snapshot(self, path="weaviate_export.json", embed=None):
+        """Load entries from a JSON export such as weaviate_export.json; returns the number indexed.
+
+        Records exported without a vector (weaviate_export.json only has them for user rows) are
+        embedded with embed(texts) -> embeddings if given, and skipped with a warning otherwise.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+
+        embeddings = []
+        for record in records:
+            embedding = record.get("embedding") or (record.get("_additional") or {}).get("vector")
+            if isinstance(embedding, str):
+                embedding = json.loads(embedding)
+            embeddings.append(embedding)
+
+        missing = [i for i, e in enumerate(embeddings) if not e and records[i].get("content")]
+        if missing and embed:
+            print(f"🔢 Embedding {len(missing)} records exported without a vector...")
+            for i, embedding in zip(missing, embed([records[i]["content"] for i in missing])):
+                embeddings[i] = embedding
+        elif missing:
+            roles = sorted({str(records[i].get("role")) for i in missing})
+            print(f"⚠️ {len(missing)}/{len(records)} records in {path} have no vector and won't be indexed "
+                  f"(roles: {', '.join(roles)}).")
+
+        return self.add_many(
+            [r.get("role") for r in records],
+            [r.get("content") for r in records],
+            embeddings,
+            [(r.get("_additional") or {}).get("id") for r in records],
+            [r.get("timestamp") for r in records],
+        )
+
+    def save_binary_snapshot(self, path, dtype="float32"):
+        """Write the index to a binary snapshot directory (see snapshot.py); returns the number of entries."""
+        with self._lock:
+            size = self._size
+            write_snapshot(
+                path, self.vectors, self.roles, self._contents[:size], self._ids[:size],
+                self._timestamps[:size], dtype, self.synced_at,
+            )
+        return size
+
+    def load_binary_snapshot(self, path):
+        """Map a binary snapshot; returns the number of entries.
+
+        On an empty index float32 vectors stay memory-mapped (read-only) and metadata is decoded
+        on access, so this takes milliseconds whatever the size. The first add copies the
+        vectors into a regular float32 matrix. float16 snapshots are converted when loaded.
+        """
+        snapshot = read_snapshot(path)
+        count = snapshot["meta"]["count"]
+        if not count:
+            return 0
+
+        with self._lock:
+            if self._size == 0:
+                self.dim = snapshot["meta"]["dim"]
+                vectors = snapshot["vectors"]
+                # float16 would be upcast on every query, so pay that once here instead
+                self._vectors = vectors if vectors.dtype == np.float32 else vectors.astype(np.float32)
+                self._role_names = snapshot["role_names"]
+                self._role_lookup = {role: code for code, role in enumerate(self._role_names)}
+                self._role_codes = snapshot["role_codes"]
+                self._contents = snapshot["contents"]
+                self._ids = snapshot["ids"]
+                self._timestamps = snapshot["timestamps"]
+                self._size = count
+                # Snapshots without synced_at fall back to their newest entry
+                stamped = snapshot["timestamps"].array[~np.isnat(snapshot["timestamps"].array)]
+                self.synced_at = snapshot["meta"].get("synced_at") or (f"{stamped.max()}Z" if len(stamped) else None)
+                return count
+
+        return self.add_many(
+            list(snapshot["roles"]), list(snapshot["contents"]), snapshot["vectors"],
+            list(snapshot["ids"]), list(snapshot["timestamps"]),
+        )
+
+    def load_export(self, prefix, content_field="content", role_field="role", class_name=None, page_size=1000):
+        """Load entries from a streaming export (see exporter.export_class); returns the number indexed.
+
+        With role_field=None every entry is indexed with class_name as its role.
+        """
+        from exporter import iter_export
+
+        total = 0
+        page = []
+        for record, vector in iter_export(prefix):
+            page.append((record, vector))
+            if len(page) >= page_size:
+                total += self._add_export_page(page, content_field, role_field, class_name)
+                page = []
+        if page:
+            total += self._add_export_page(page, content_field, role_field, class_name)
+        return total
+
+    def _add_export_page(self, page, content_field, role_field, class_name):
+        return self.add_many(
+            [r.get(role_field) if role_field else class_name for r, _ in page],
+            [r.get(content_field) for r, _ in page],
+            [v for _, v in page],
+            [r["id"] for r, _ in page],
+            [r.get("timestamp") for r, _ in page],
+        )
+
+    def load_from_weaviate(self, client, class_name="ChatHistory", page_size=500,
+                           content_field="content", role_field="role", timestamp_field="timestamp"):
+        """Page through a Weaviate class with a cursor and index every object vector.
+
+        With role_field=None every entry is indexed with the class name as its role.
+        """
+        started = _utcnow()
+        total = 0
+        cursor = None
+        fields = [f for f in (role_field, content_field, timestamp_field) if f] + ["_additional { id vector }"]
+        while True:
+            query = client.query.get(class_name, fields).with_limit(page_size)
+            if cursor:
+                query = query.with_after(cursor)
+            response = query.do()
+
+            records = response.get("data", {}).get("Get", {}).get(class_name) or []
+            if not records:
+                break
+
+            total += self.add_many(
+                [r.get(role_field) if role_field else class_name for r in records],
+                [r.get(content_field) for r in records],
+                [r["_additional"].get("vector") for r in records],
+                [r["_additional"]["id"] for r in records],
+                [r.get(timestamp_field) if timestamp_field else None for r in records],
+            )
+            cursor = records[-1]["_additional"]["id"]
+        self.synced_at = started
+        return total
+
+    def _ids_since(self, cutoff):
+        """Ids of entries stamped at or after cutoff (a numpy datetime64)."""
+        mapped = getattr(self._timestamps, "array", None)
+        rows = np.flatnonzero(mapped >= cutoff).tolist() if mapped is not None else []
+        for row in range(len(mapped) if mapped is not None else 0, self._size):
+            if parse_timestamp(self._timestamps[row]) >= cutoff:
+                rows.append(row)
+        return {self._ids[row] for row in rows}
+
+    def catch_up_from_weaviate(self, client, class_name="ChatHistory", overlap_s=600, page_size=500,
+                               content_field="content", role_field="role", timestamp_field="timestamp"):
+        """Index objects stamped since synced_at that the index doesn't hold yet; returns the number added.
+
+        Objects other processes wrote after the index was loaded (and so after its snapshot
+        was taken) are picked up this way. overlap_s goes back a little further for clock
+        skew and writes that were in flight.
+        """
+        if not self.synced_at:
+            return 0
+        started = _utcnow()
+        cutoff = parse_timestamp(self.synced_at) - np.timedelta64(overlap_s, "s")
+        known = self._ids_since(cutoff)
+
+        total = 0
+        offset = 0
+        fields = [f for f in (role_field, content_field, timestamp_field) if f] + ["_additional { id vector }"]
+        while True:
+            # Cursors can't be combined with filters, so this pages by offset
+            response = (
+                client.query.get(class_name, fields)
+                .with_where({"path": [timestamp_field], "operator": "GreaterThanEqual", "valueDate": f"{cutoff}Z"})
+                .with_limit(page_size)
+                .with_offset(offset)
+                .do()
+            )
+            records = response.get("data", {}).get("Get", {}).get(class_name) or []
+            if not records:
+                break
+            offset += len(records)
+
+            records = [r for r in records if r["_additional"]["id"] not in known]
+            total += self.add_many(
+                [r.get(role_field) if role_field else class_name for r in records],
+                [r.get(content_field) for r in records],
+                [r["_additional"].get("vector") for r in records],
+                [r["_additional"]["id"] for r in records],
+                [r.get(timestamp_field) for r in records],
+            )
+        self.synced_at = started
+        return total
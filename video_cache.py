@@ -0,0 +1,131 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+
+def chunk_key(prompt_version, chunk):
+    """Content address of a chunk's Q&A: sha256 over (prompt version, chunk text)."""
+    return hashlib.sha256(f"{prompt_version}\0{chunk}".encode("utf-8")).hexdigest()
+
+
+class VideoCache:
+    """SQLite cache of fetched transcripts, generated chunk Q&A and learned videos, keyed by YouTube video id."""
+
+    def __init__(self, path="video_cache.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            "video_id TEXT PRIMARY KEY, title TEXT, transcript TEXT NOT NULL, fetched_at TEXT NOT NULL, "
+            "learned_at TEXT, prompt_version TEXT, chunk_keys TEXT, chunks_total INTEGER)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(videos)")}
+        if "chunks_total" not in columns:  # caches created before partial learning was tracked
+            self._db.execute("ALTER TABLE videos ADD COLUMN chunks_total INTEGER")
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunks (key TEXT PRIMARY KEY, qa TEXT NOT NULL)")
+        self._db.commit()
+
+    def get_transcript(self, video_id):
+        """Return {"text", "title"} for a fetched video, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT transcript, title FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        return {"text": row[0], "title": row[1]} if row else None
+
+    def put_transcript(self, video_id, title, transcript):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO videos (video_id, title, transcript, fetched_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(video_id) DO UPDATE SET title = excluded.title, transcript = excluded.transcript, "
+                "fetched_at = excluded.fetched_at",
+                (video_id, title, transcript, datetime.utcnow().isoformat()),
+            )
+            self._db.commit()
+
+    def get_chunk(self, key):
+        """Return the cached Q&A list for a chunk key, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT qa FROM chunks WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_chunk(self, key, qa_conversation):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chunks (key, qa) VALUES (?, ?)",
+                (key, json.dumps(qa_conversation, ensure_ascii=False)),
+            )
+            self._db.commit()
+
+    def mark_learned(self, video_id, prompt_version, chunk_keys):
+        """Record that every chunk of the video was stored with this prompt version."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE videos SET learned_at = ?, prompt_version = ?, chunk_keys = ?, chunks_total = ? WHERE video_id = ?",
+                (datetime.utcnow().isoformat(), prompt_version, json.dumps(chunk_keys), len(chunk_keys), video_id),
+            )
+            self._db.commit()
+
+    def mark_partial(self, video_id, prompt_version, chunk_keys, chunks_total):
+        """Record that only these chunks of the video's chunks_total were stored with this prompt version."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE videos SET learned_at = NULL, prompt_version = ?, chunk_keys = ?, chunks_total = ? WHERE video_id = ?",
+                (prompt_version, json.dumps(chunk_keys), chunks_total, video_id),
+            )
+            self._db.commit()
+
+    def stored_chunks(self, video_id, prompt_version):
+        """Keys of the video's chunks already stored with this prompt version."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT chunk_keys FROM videos WHERE video_id = ? AND prompt_version = ?", (video_id, prompt_version)
+            ).fetchone()
+        return set(json.loads(row[0])) if row and row[0] else set()
+
+    def is_learned(self, video_id, prompt_version):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM videos WHERE video_id = ? AND learned_at IS NOT NULL AND prompt_version = ?",
+                (video_id, prompt_version),
+            ).fetchone()
+        return row is not None
+
+    def list_videos(self):
+        """Return one dict per cached video, most recently learned first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT video_id, title, fetched_at, learned_at, prompt_version, chunk_keys, chunks_total FROM videos "
+                "ORDER BY learned_at IS NULL, learned_at DESC, fetched_at DESC"
+            ).fetchall()
+        return [
+            {
+                "video_id": video_id,
+                "title": title,
+                "fetched_at": fetched_at,
+                "learned_at": learned_at,
+                "prompt_version": prompt_version,
+                "chunks": len(json.loads(chunk_keys)) if chunk_keys else 0,
+                "chunks_total": chunks_total or 0,
+            }
+            for video_id, title, fetched_at, learned_at, prompt_version, chunk_keys, chunks_total in rows
+        ]
+
+    def invalidate(self, video_id, chunk_keys=()):
+        """Forget a video's transcript and generated Q&A; returns False if it wasn't cached.
+
+        chunk_keys adds generated chunks that were never stored (and so aren't recorded).
+        """
+        with self._lock:
+            row = self._db.execute("SELECT chunk_keys FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None:
+                return False
+            keys = set(json.loads(row[0]) if row[0] else []) | set(chunk_keys)
+            self._db.executemany("DELETE FROM chunks WHERE key = ?", [(key,) for key in keys])
+            self._db.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+            self._db.commit()
+        return True
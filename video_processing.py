@@ -8,13 +8,47 @@ from pytube import YouTube, extract
 from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound
 from dotenv import load_dotenv
 from db import store_qa_in_weaviate
+from video_cache import VideoCache, chunk_key
+import llm
+import hashlib
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 pytube.request.default_range_size = 1048576
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_TOKEN")
 
+QA_CHUNK_SIZE = 750  # transcript words per GPT request
+QA_CHUNK_CONCURRENCY = int(os.getenv("QA_CHUNK_CONCURRENCY", "4"))  # transcript chunks sent to GPT in parallel
+QA_CHUNK_MAX_ATTEMPTS = int(os.getenv("QA_CHUNK_MAX_ATTEMPTS", "3"))
+VIDEO_CHECKPOINT_DIR = os.getenv("VIDEO_CHECKPOINT_DIR", "video_checkpoints")  # per-video generated chunks
+VIDEO_CACHE_PATH = os.getenv("VIDEO_CACHE_PATH", "video_cache.sqlite3")
+
+QA_MODEL = "gpt-4-1106-preview"
+QA_MAX_TOKENS = 750
+QA_SYSTEM_PROMPT = "You are an expert at generating Q&A from transcripts."
+QA_PROMPT = """
+    Convert the following transcript into a conversation between a user and an assistant:
+
+    {chunk}
+
+    The user should ask meaningful questions, and the assistant should provide well-structured responses.
+
+    Return the response in JSON format like:
+    [
+        {{"role": "user", "content": "User's question"}},
+        {{"role": "assistant", "content": "Assistant's response"}},
+        ...
+    ]
+    """
+# Cached chunk Q&A and learned videos are only reused while the prompt and model stay the same
+QA_PROMPT_VERSION = hashlib.sha256(
+    f"{QA_MODEL}\0{QA_MAX_TOKENS}\0{QA_SYSTEM_PROMPT}\0{QA_PROMPT}".encode("utf-8")
+).hexdigest()[:16]
+
+video_cache = VideoCache(VIDEO_CACHE_PATH)
+
 
 def transcribe_youtube_video(video_url):
     """Fetches captions (subtitles) from a YouTube video."""
@@ -43,9 +77,6 @@ def transcribe_youtube_video(video_url):
         # Combine captions into a single transcript text
         transcript_text = " ".join([caption['text'] for caption in captions])
 
-        # Properly close video stream
-        yt.streams.get_highest_resolution().stream.close()
-
         return {
             "title": video_title,
             "transcript": transcript_text
@@ -74,10 +105,10 @@ def generate_qa_from_transcript(transcript_text):
         ]
         """
 
-        response = openai.ChatCompletion.create(
+        response = llm.chat_completion_sync(
+            [{"role": "system", "content": "You are an expert at generating Q&A from transcripts."},
+             {"role": "user", "content": prompt}],
             model="gpt-4-1106-preview",
-            messages=[{"role": "system", "content": "You are an expert at generating Q&A from transcripts."},
-                      {"role": "user", "content": prompt}],
             max_tokens=750
         )
 
@@ -131,53 +162,154 @@ def get_transcript_with_headers(video_url):
         return None
 
 
-def generate_qa_from_large_transcript(transcript_text, chunk_size=750):
-    """Converts a large transcript into a Q&A conversation using GPT, splitting if necessary."""
-    try:
-        # Split the transcript into manageable chunks
-        words = transcript_text.split()
-        chunks = [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+def split_transcript(transcript_text, chunk_size=QA_CHUNK_SIZE):
+    """Split a transcript into chunks of chunk_size words."""
+    words = transcript_text.split()
+    return [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
 
-        all_qa_conversations = []
 
-        # Process each chunk and append results
-        for i, chunk in enumerate(chunks):
-            print(f"Processing chunk {i + 1}/{len(chunks)}...")
-
-            prompt = f"""
-            Convert the following transcript into a conversation between a user and an assistant:
+def validate_qa(qa_conversation):
+    """Return the Q&A entries if they have the expected shape, else raise ValueError."""
+    if not isinstance(qa_conversation, list) or not qa_conversation:
+        raise ValueError("expected a non-empty JSON list")
+    for entry in qa_conversation:
+        if not isinstance(entry, dict) or entry.get("role") not in ("user", "assistant") \
+                or not isinstance(entry.get("content"), str) or not entry["content"].strip():
+            raise ValueError(f"invalid Q&A entry: {str(entry)[:100]}")
+    return qa_conversation
 
-            {chunk}
 
-            The user should ask meaningful questions, and the assistant should provide well-structured responses.
+def _generate_qa_for_chunk(number, total, chunk):
+    """Converts one transcript chunk into validated Q&A; returns (qa_conversation, metrics)."""
+    start = time.perf_counter()
+    response = llm.chat_completion_sync(
+        [
+            {"role": "system", "content": QA_SYSTEM_PROMPT},
+            {"role": "user", "content": QA_PROMPT.format(chunk=chunk)}
+        ],
+        model=QA_MODEL,
+        max_tokens=QA_MAX_TOKENS,
+    )
+    usage = response.get('usage', {})
+    metrics = {
+        "chunk": number,
+        "latency_s": time.perf_counter() - start,
+        "prompt_tokens": usage.get('prompt_tokens', 0),
+        "completion_tokens": usage.get('completion_tokens', 0),
+    }
+
+    # Extract the content
+    raw_content = response['choices'][0]['message']['content']
+
+    # Remove code block markers if they exist
+    cleaned_content = re.sub(r"^```json\n|```$", "", raw_content.strip(), flags=re.MULTILINE)
+
+    # Convert to JSON
+    qa_conversation = validate_qa(json.loads(cleaned_content))
+    print(f"✅ Chunk {number}/{total} done in {metrics['latency_s']:.1f}s "
+          f"({metrics['prompt_tokens']} prompt + {metrics['completion_tokens']} completion tokens)")
+    return qa_conversation, metrics
+
+
+def _generate_qa_with_retries(number, total, chunk, attempts=QA_CHUNK_MAX_ATTEMPTS):
+    """Like _generate_qa_for_chunk, but retries this chunk alone; qa_conversation is None if every attempt failed."""
+    spent = {"chunk": number, "latency_s": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+    for attempt in range(1, attempts + 1):
+        start = time.perf_counter()
+        try:
+            qa_conversation, metrics = _generate_qa_for_chunk(number, total, chunk)
+            metrics["attempts"] = attempt
+            return qa_conversation, metrics
+        except json.JSONDecodeError as e:
+            error = f"invalid JSON ({e})"
+        except ValueError as e:
+            error = str(e)
+        except openai.error.OpenAIError as e:
+            error = f"OpenAI API error ({e})"
+        except Exception as e:
+            error = f"unexpected error ({e})"
+        spent["latency_s"] += time.perf_counter() - start
 
-            Return the response in JSON format like:
-            [
-                {{"role": "user", "content": "User's question"}},
-                {{"role": "assistant", "content": "Assistant's response"}},
-                ...
-            ]
-            """
+        print(f"⚠️ Chunk {number}/{total} attempt {attempt}/{attempts} failed: {error}")
+        if attempt < attempts:
+            time.sleep(2 ** attempt)
 
-            # Make the API call
-            response = openai.ChatCompletion.create(
-                model="gpt-4-1106-preview",
-                messages=[
-                    {"role": "system", "content": "You are an expert at generating Q&A from transcripts."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=750,
-            )
+    spent["attempts"] = attempts
+    return None, spent
 
-            # Extract the content
-            raw_content = response['choices'][0]['message']['content']
 
-            # Remove code block markers if they exist
-            cleaned_content = re.sub(r"^```json\n|```$", "", raw_content.strip(), flags=re.MULTILINE)
+def iter_qa_chunks(chunks, concurrency=QA_CHUNK_CONCURRENCY, skip=()):
+    """Yield (index, qa_conversation or None, metrics) for each chunk as soon as it finishes.
 
-            # Convert to JSON
-            qa_conversation = json.loads(cleaned_content)
-            all_qa_conversations.extend(qa_conversation)
+    Chunks whose Q&A is cached for the current prompt come back first without a GPT
+    call; the rest run `concurrency` at a time. Indexes in skip are not processed.
+    """
+    keys = [chunk_key(QA_PROMPT_VERSION, chunk) for chunk in chunks]
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="qa-chunk")
+    try:
+        futures, cached = {}, []
+        for i, chunk in enumerate(chunks):
+            if i in skip:
+                continue
+            qa_conversation = video_cache.get_chunk(keys[i])
+            if qa_conversation is not None:
+                cached.append((i, qa_conversation))
+            else:
+                futures[executor.submit(_generate_qa_with_retries, i + 1, len(chunks), chunk)] = i
+
+        for i, qa_conversation in cached:
+            yield i, qa_conversation, {"chunk": i + 1, "latency_s": 0.0, "prompt_tokens": 0,
+                                       "completion_tokens": 0, "attempts": 0, "cached": True}
+
+        for future in as_completed(futures):
+            qa_conversation, metrics = future.result()
+            index = futures[future]
+            if qa_conversation is not None:
+                video_cache.put_chunk(keys[index], qa_conversation)
+            yield index, qa_conversation, metrics
+    finally:
+        # Don't start chunks nobody will consume (e.g. the caller stopped early)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _log_chunk_metrics(chunk_metrics, wall_s):
+    if not chunk_metrics:
+        return
+    slowest = max(chunk_metrics, key=lambda m: m["latency_s"])
+    print(
+        f"📊 {len(chunk_metrics)} chunks ({sum(m.get('cached', False) for m in chunk_metrics)} cached) in {wall_s:.1f}s wall "
+        f"({sum(m['latency_s'] for m in chunk_metrics):.1f}s of GPT time, "
+        f"slowest chunk {slowest['chunk']} at {slowest['latency_s']:.1f}s, "
+        f"{sum(m['prompt_tokens'] + m['completion_tokens'] for m in chunk_metrics)} tokens, "
+        f"{sum(max(0, m['attempts'] - 1) for m in chunk_metrics)} retries)"
+    )
+
+
+def generate_qa_from_large_transcript(transcript_text, chunk_size=QA_CHUNK_SIZE, concurrency=QA_CHUNK_CONCURRENCY):
+    """Converts a large transcript into a Q&A conversation using GPT, splitting if necessary.
+
+    Chunks are processed `concurrency` at a time and reassembled in transcript order.
+    A chunk that still fails after its retries is left out; None only if every chunk failed.
+    """
+    try:
+        chunks = split_transcript(transcript_text, chunk_size)
+        print(f"Processing {len(chunks)} chunks, {concurrency} at a time...")
+        start = time.perf_counter()
+
+        results = [None] * len(chunks)
+        chunk_metrics = []
+        for index, qa_conversation, metrics in iter_qa_chunks(chunks, concurrency):
+            results[index] = qa_conversation
+            chunk_metrics.append(metrics)
+        _log_chunk_metrics(chunk_metrics, time.perf_counter() - start)
+
+        failed = [i + 1 for i, qa in enumerate(results) if qa is None]
+        if failed:
+            print(f"⚠️ Left out {len(failed)} chunks that kept failing: {failed}")
+
+        all_qa_conversations = [entry for qa in results if qa for entry in qa]
+        if not all_qa_conversations:
+            return None
 
         # Save the combined JSON data to a file
         with open('combined_qa_conversation.json', 'w', encoding='utf-8') as f:
@@ -186,40 +318,202 @@ def generate_qa_from_large_transcript(transcript_text, chunk_size=750):
         print("All chunks processed and saved to combined_qa_conversation.json")
         return all_qa_conversations
 
-    except json.JSONDecodeError as e:
-        print(f"JSON Decode Error: {e}")
-        print("Check the format of the response. It might not be valid JSON.")
-        return None
-    except openai.error.OpenAIError as e:
-        print(f"OpenAI API Error: {e}")
-        return None
     except Exception as e:
         print(f"Unexpected Error: {e}")
         return None
 
 
-def learn_video_content(video_url):
-    """Processes a YouTube video and learns its content."""
-    print("📥 Fetching video transcript...")
+def _video_id(video_url):
+    """The 11-character YouTube id of any watch/youtu.be/shorts URL, or of a bare id."""
+    try:
+        return extract.video_id(video_url)
+    except pytube.exceptions.RegexMatchError:
+        if re.fullmatch(r"[0-9A-Za-z_-]{11}", video_url.strip()):
+            return video_url.strip()
+        raise ValueError(f"Not a YouTube video URL or id: {video_url}")
+
+
+def fetch_transcript(video_url):
+    """get_transcript_with_headers, served from the video cache when the video was fetched before."""
+    video_id = _video_id(video_url)
+    cached = video_cache.get_transcript(video_id)
+    if cached:
+        print(f"📦 Using cached transcript for video {video_id}.")
+        return cached
+
     transcript_data = get_transcript_with_headers(video_url)
-    
-    if not transcript_data:
-        print("❌ Could not retrieve transcript.")
-        return
+    if transcript_data:
+        video_cache.put_transcript(video_id, transcript_data["title"], transcript_data["text"])
+    return transcript_data
 
-    print("📝 Generating Q&A from transcript...")
-    qa_conversation = generate_qa_from_large_transcript(transcript_data["text"], chunk_size=750)
 
-    if not qa_conversation:
-        print("❌ Failed to generate Q&A.")
-        return
+def canonical_video_url(video_url):
+    """One URL per video, so different links to it share a job, cache entry and checkpoint."""
+    return f"https://www.youtube.com/watch?v={_video_id(video_url)}"
+
+
+def is_video_learned(video_url):
+    """True if the video was fully learned with the current Q&A prompt."""
+    return store_video_qa(video_url)
+
+
+def list_learned_videos():
+    """Cached videos, most recently learned first (see VideoCache.list_videos)."""
+    return video_cache.list_videos()
+
+
+def forget_video(video_url_or_id):
+    """Drop a video's cached transcript, Q&A and checkpoint so the next request learns it from scratch.
+
+    Objects already stored in Weaviate are kept; re-learning writes the same ids again.
+    """
+    video_id = _video_id(video_url_or_id)
+    cached = video_cache.get_transcript(video_id)
+    keys = [chunk_key(QA_PROMPT_VERSION, c) for c in split_transcript(cached["text"])] if cached else []
+    if os.path.exists(_checkpoint_path(video_id)):
+        os.remove(_checkpoint_path(video_id))
+    return video_cache.invalidate(video_id, keys)
+
+
+def _checkpoint_path(video_id):
+    return os.path.join(VIDEO_CHECKPOINT_DIR, f"{video_id}.json")
+
+
+def load_video_checkpoint(video_id, transcript_text, chunk_size):
+    """Return the video's checkpoint, or a fresh one if there is none or the transcript/chunking changed."""
+    fingerprint = hashlib.sha256(transcript_text.encode("utf-8")).hexdigest()
+    try:
+        with open(_checkpoint_path(video_id), "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("transcript_sha256") == fingerprint and checkpoint.get("chunk_size") == chunk_size:
+            return checkpoint
+        print("⚠️ Transcript changed since the last run, starting this video over.")
+    except FileNotFoundError:
+        pass
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Corrupt checkpoint for video {video_id}, starting over: {e}")
+    return {"video_id": video_id, "transcript_sha256": fingerprint, "chunk_size": chunk_size, "chunks": {}}
 
-    print("💾 Storing Q&A in Weaviate...")
-    import json
+
+def save_video_checkpoint(checkpoint):
+    """Write the checkpoint atomically so a crash mid-write can't corrupt it."""
+    os.makedirs(VIDEO_CHECKPOINT_DIR, exist_ok=True)
+    path = _checkpoint_path(checkpoint["video_id"])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def generate_video_qa(video_url, progress=None):
+    """Generates a video's Q&A into its checkpoint without storing it (see store_video_qa).
+
+    This is the slow, GPT-bound half of learning a video and runs in job worker processes.
+    Each chunk is checkpointed as soon as it is generated, so a crashed or repeated run only
+    redoes the missing chunks. Returns True once every chunk has Q&A; progress(done, total)
+    is called as chunks finish.
+    """
+    video_id = _video_id(video_url)
+    if video_cache.is_learned(video_id, QA_PROMPT_VERSION):
+        print(f"✅ Video {video_id} was already learned, nothing to do.")
+        return True
+
+    print("📥 Fetching video transcript...")
+    transcript_data = fetch_transcript(video_url)
+    
+    if not transcript_data:
+        print("❌ Could not retrieve transcript.")
+        return False
+
+    chunks = split_transcript(transcript_data["text"], QA_CHUNK_SIZE)
+    checkpoint = load_video_checkpoint(video_id, transcript_data["text"], QA_CHUNK_SIZE)
+    done = {int(i) for i in checkpoint["chunks"]}
+    if done:
+        print(f"⏩ Resuming: {len(done)}/{len(chunks)} chunks already generated.")
+    if progress:
+        progress(len(done), len(chunks))
+
+    print(f"📝 Generating Q&A for {len(chunks) - len(done)} chunks...")
+    start = time.perf_counter()
+    chunk_metrics = []
+    for index, qa_conversation, metrics in iter_qa_chunks(chunks, skip=done):
+        chunk_metrics.append(metrics)
+        if qa_conversation:
+            checkpoint["chunks"][str(index)] = qa_conversation
+            save_video_checkpoint(checkpoint)
+            if progress:
+                progress(len(checkpoint["chunks"]), len(chunks))
+    _log_chunk_metrics(chunk_metrics, time.perf_counter() - start)
+
+    missing = len(chunks) - len(checkpoint["chunks"])
+    if missing:
+        print(f"⚠️ {missing}/{len(chunks)} chunks failed; run again to retry just those.")
+        return False
+    return True
+
+
+def store_video_qa(video_url):
+    """Stores whatever generated Q&A of a video isn't stored yet, and marks the video learned once all of it is.
+
+    Runs in the bot process, so the local vector, Q&A and near-duplicate indexes see the new
+    entries, and can be called repeatedly while generate_video_qa is still running. Stored
+    chunks are recorded in the video cache, so until every chunk is stored the video is listed
+    as partially learned and a later call only stores the rest. Returns True once the whole
+    video is stored.
+    """
+    video_id = _video_id(video_url)
+    if video_cache.is_learned(video_id, QA_PROMPT_VERSION):
+        return True
+
+    transcript_data = video_cache.get_transcript(video_id)  # fetched by generate_video_qa
+    if not transcript_data:
+        return False
+
+    chunks = split_transcript(transcript_data["text"], QA_CHUNK_SIZE)
+    keys = [chunk_key(QA_PROMPT_VERSION, chunk) for chunk in chunks]
+    checkpoint = load_video_checkpoint(video_id, transcript_data["text"], QA_CHUNK_SIZE)
+    stored = video_cache.stored_chunks(video_id, QA_PROMPT_VERSION) & set(keys)
+    ready = [index for index in sorted(map(int, checkpoint["chunks"])) if keys[index] not in stored]
+
+    if ready:
+        print(f"💾 Storing Q&A for {len(ready)} chunks...")
+    source = f"video:{transcript_data['title']}"
+    for index in ready:
+        # Object ids are derived from the content, so re-storing a chunk after a crash is harmless
+        if not store_qa_in_weaviate(checkpoint["chunks"][str(index)], source=source):
+            print(f"⚠️ Couldn't store chunk {index + 1}; it'll be retried with the remaining chunks.")
+            break
+        stored.add(keys[index])
+        video_cache.mark_partial(video_id, QA_PROMPT_VERSION, [key for key in keys if key in stored], len(chunks))
+
+    if len(stored) < len(set(keys)):
+        if ready:
+            print(f"⏳ Video {video_id} is partially learned: {len(stored)}/{len(set(keys))} chunks stored.")
+        return False
+
+    qa_conversation = [entry for i in sorted(checkpoint["chunks"], key=int) for entry in checkpoint["chunks"][i]]
     with open("qa_conversation.json", "w", encoding="utf-8") as f:
         json.dump( qa_conversation, f, ensure_ascii=False, indent=4)
 
-    store_qa_in_weaviate(qa_conversation)
-    
+    # Fully stored; a later run should learn the video from scratch
+    if os.path.exists(_checkpoint_path(checkpoint["video_id"])):
+        os.remove(_checkpoint_path(checkpoint["video_id"]))
+    video_cache.mark_learned(video_id, QA_PROMPT_VERSION, [chunk_key(QA_PROMPT_VERSION, c) for c in chunks])
     print(f"✅ Finished learning content from video: {transcript_data['title']}")
+    return True
+
+
+def learn_video_content(video_url, progress=None):
+    """Processes a YouTube video and learns its content, all in this process.
+
+    Each chunk is stored as soon as its Q&A is generated, so chunks that keep failing don't
+    hold back the rest. Returns True once the whole video is stored; progress(done, total)
+    reports generated chunks.
+    """
+    def store_and_report(done, total):
+        store_video_qa(video_url)
+        if progress:
+            progress(done, total)
 
+    generate_video_qa(video_url, store_and_report)
+    return store_video_qa(video_url)